@@ -0,0 +1,6 @@
+# Entry point of `python codegen <command>`, e.g. `python codegen render`, see utils/cli.py
+import sys
+
+from utils.cli import main
+
+sys.exit(main())
@@ -1,16 +1,87 @@
 
+#include <algorithm>
 #include <lean/lean.h>
 #include <ginac/ginac.h>
 #include "CppClass.h"
+#include "LeanString.h"
 using namespace std;
 using namespace GiNaC;
 
+// Printed straight into the buffer of a Lean string
+extern "C" LEAN_EXPORT lean_obj_res Ginac_Symbol_toString(b_lean_obj_arg _self) {
+    return of_printed(*to_cppClass<symbol>(_self));
+}
+
 extern "C" LEAN_EXPORT lean_obj_res Ginac_Symbol_mk(b_lean_obj_arg _arg_name, b_lean_obj_arg _arg_another) {
-    auto _ret_symbol = new symbol(lean_string_cstr(_arg_name), lean_string_cstr(_arg_another));
-    return of_cppClass(_ret_symbol);
+    return make_cppClass<symbol>(to_std_string(_arg_name), to_std_string(_arg_another));
+}
+// Constructs from the arguments at the same index, up to the shortest array
+extern "C" LEAN_EXPORT lean_obj_res Ginac_Symbol_mkBatch(b_lean_obj_arg _arg_name, b_lean_obj_arg _arg_another) {
+    size_t _size = lean_array_size(_arg_name);
+    _size = std::min(_size, lean_array_size(_arg_another));
+    lean_object ** _arg_name_cptr = lean_array_cptr(_arg_name);
+    lean_object ** _arg_another_cptr = lean_array_cptr(_arg_another);
+    lean_object * _ret = lean_alloc_array(_size, _size);
+    lean_object ** _ret_cptr = lean_array_cptr(_ret);
+    for (size_t _i = 0; _i < _size; _i++) {
+        _ret_cptr[_i] = make_cppClass<symbol>(to_std_string(_arg_name_cptr[_i]), to_std_string(_arg_another_cptr[_i]));
+    }
+    return _ret;
 }
 extern "C" LEAN_EXPORT lean_obj_res Ginac_Symbol_name(b_lean_obj_arg _self, b_lean_obj_arg _arg_how, b_lean_obj_arg _arg_are, b_lean_obj_arg _arg_you) {
     auto self = to_cppClass<symbol>(_self);
-    auto _ret_std_string = self->get_name(lean_string_cstr(_arg_how), lean_string_cstr(_arg_are), lean_string_cstr(_arg_you));
-    return lean_mk_string(_ret_std_string.c_str());
+    auto _ret_std_string = self->get_name(to_std_string(_arg_how), to_std_string(_arg_are), to_std_string(_arg_you));
+    return of_std_string(_ret_std_string);
+}
+// Calls the method on every receiver with the same arguments
+extern "C" LEAN_EXPORT lean_obj_res Ginac_Symbol_nameBatch(b_lean_obj_arg _selfs, b_lean_obj_arg _arg_how, b_lean_obj_arg _arg_are, b_lean_obj_arg _arg_you) {
+    size_t _size = lean_array_size(_selfs);
+    lean_object ** _selfs_cptr = lean_array_cptr(_selfs);
+    lean_object * _ret = lean_alloc_array(_size, _size);
+    lean_object ** _ret_cptr = lean_array_cptr(_ret);
+    for (size_t _i = 0; _i < _size; _i++) {
+        auto self = to_cppClass<symbol>(_selfs_cptr[_i]);
+        auto _ret_std_string = self->get_name(to_std_string(_arg_how), to_std_string(_arg_are), to_std_string(_arg_you));
+        _ret_cptr[_i] = of_std_string(_ret_std_string);
+    }
+    return _ret;
+}
+// Mutates `_self` in place if it's exclusive, otherwise a copy of it
+extern "C" LEAN_EXPORT lean_obj_res Ginac_Symbol_set_name(lean_obj_arg _self, b_lean_obj_arg _arg_name) {
+    _self = cppClass_make_exclusive<symbol>(_self);
+    auto self = to_cppClass<symbol>(_self);
+    self->set_name(to_std_string(_arg_name));
+    return _self;
+}
+// Mutates `_self` in place if it's exclusive, otherwise a copy of it
+extern "C" LEAN_EXPORT lean_obj_res Ginac_Symbol_set_name_and_get_serial(lean_obj_arg _self, b_lean_obj_arg _arg_name) {
+    _self = cppClass_make_exclusive<symbol>(_self);
+    auto self = to_cppClass<symbol>(_self);
+    auto _ret_unsigned_int = self->set_name_and_get_serial(to_std_string(_arg_name));
+    auto _pair = lean_alloc_ctor(0, 2, 0);
+    lean_ctor_set(_pair, 0, _self);
+    lean_ctor_set(_pair, 1, lean_box_uint32(_ret_unsigned_int));
+    return _pair;
+}
+extern "C" LEAN_EXPORT lean_obj_res Ginac_Symbol_escape_name(b_lean_obj_arg _arg_name) {
+    auto _ret_std_string = symbol::escape_name(to_std_string(_arg_name));
+    return of_std_string(_ret_std_string);
+}
+extern "C" LEAN_EXPORT double Ginac_Symbol_scaled_serial(b_lean_obj_arg _self, double _arg_scale, uint8_t _arg_round) {
+    auto self = to_cppClass<symbol>(_self);
+    auto _ret_double = self->scaled_serial(_arg_scale, _arg_round);
+    return _ret_double;
+}
+// Calls the method on every receiver with the same arguments
+extern "C" LEAN_EXPORT lean_obj_res Ginac_Symbol_scaled_serialBatch(b_lean_obj_arg _selfs, double _arg_scale, uint8_t _arg_round) {
+    size_t _size = lean_array_size(_selfs);
+    lean_object ** _selfs_cptr = lean_array_cptr(_selfs);
+    lean_object * _ret = lean_alloc_array(_size, _size);
+    lean_object ** _ret_cptr = lean_array_cptr(_ret);
+    for (size_t _i = 0; _i < _size; _i++) {
+        auto self = to_cppClass<symbol>(_selfs_cptr[_i]);
+        auto _ret_double = self->scaled_serial(_arg_scale, _arg_round);
+        _ret_cptr[_i] = lean_box_float(_ret_double);
+    }
+    return _ret;
 }
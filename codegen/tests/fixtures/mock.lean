@@ -1,4 +1,5 @@
 
+import Ginac.Classes
 import Ginac.Dep
 
 namespace Ginac
@@ -7,11 +8,37 @@ opaque SymbolPointed : NonemptyType
 def Symbol : Type := (SymbolPointed).type
 instance : Nonempty (Symbol) := (SymbolPointed).property
 
+@[extern "Ginac_Symbol_toString"]
+opaque Symbol.toString (self : @& Symbol) : String
+
+instance : ToString Symbol := ⟨Symbol.toString⟩
+
 @[extern "Ginac_Symbol_mk"]
 opaque Symbol.mk (name : @&String) (another : @&String) : Symbol
 
+@[extern "Ginac_Symbol_mkBatch"]
+opaque Symbol.mkBatch (name : @& Array String) (another : @& Array String) : Array Symbol
+
 @[extern "Ginac_Symbol_name"]
-opaque Symbol.name (how : @&String) (are : @&String) (you : @&String) : String
+opaque Symbol.name (self : @& Symbol) (how : @&String) (are : @&String) (you : @&String) : String
+
+@[extern "Ginac_Symbol_nameBatch"]
+opaque Symbol.nameBatch (selfs : @& Array Symbol) (how : @&String) (are : @&String) (you : @&String) : Array String
+
+@[extern "Ginac_Symbol_set_name"]
+opaque Symbol.set_name (self : Symbol) (name : @&String) : Symbol
+
+@[extern "Ginac_Symbol_set_name_and_get_serial"]
+opaque Symbol.set_name_and_get_serial (self : Symbol) (name : @&String) : Symbol × UInt32
+
+@[extern "Ginac_Symbol_escape_name"]
+opaque Symbol.escape_name (name : @&String) : String
+
+@[extern "Ginac_Symbol_scaled_serial"]
+opaque Symbol.scaled_serial (self : @& Symbol) (scale : Float) (round : Bool) : Float
+
+@[extern "Ginac_Symbol_scaled_serialBatch"]
+opaque Symbol.scaled_serialBatch (selfs : @& Array Symbol) (scale : Float) (round : Bool) : Array Float
 
 
 end Ginac
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+
+# A temporary directory of headers per test, removed after it
+class HeadersTestCase(unittest.TestCase):
+    dir: Path
+
+    def setUp(self) -> None:
+        self.dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.dir)
+
+    def write_header(self, name: str, text: str) -> Path:
+        header = self.dir / name
+        header.parent.mkdir(parents=True, exist_ok=True)
+        header.write_text(text, encoding="utf-8")
+        return header
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import copy
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.ast_json import AstJsonCollector, iter_entities, shorten, shorten_dump
+from utils.serialize import dump_interface, load_interface
+
+dir_root: Path = Path(os.path.dirname(os.path.realpath(__file__))).parent.parent
+dir_fixture: Path = dir_root / "codegen" / "tests" / "fixtures"
+
+# Shortened with `jaq -f scripts/dump.jq`
+SHORT_FIXTURES: List[str] = [
+    "ginac-basic-h-short.json",
+    "ginac-symbol-h-short.json",
+    "cln-real-h-short.json",
+]
+
+
+def to_raw(value: Any) -> Any:
+    # A dump of clang that shortens to `value`: what `scripts/dump.jq` removes is added back
+    if isinstance(value, list):
+        return [to_raw(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    raw: Dict[str, Any] = {"id": "0x1"}
+    for key, field in value.items():
+        raw[key] = to_raw_loc(field) if key == "loc" else to_raw(field)
+    raw["range"] = {"begin": {"offset": 0}, "end": {"offset": 1}}
+    if "loc" not in raw:
+        raw["loc"] = None
+    if raw.get("kind") == "CXXMethodDecl" and "inner" in raw:
+        raw["inner"].append({"kind": "CompoundStmt", "inner": []})
+    if raw.get("kind") == "ParmVarDecl":
+        raw["type"]["inner"] = [{"kind": "BuiltinType"}]
+    return raw
+
+
+def to_raw_loc(loc: Dict[str, Any]) -> Dict[str, Any]:
+    spelling_loc = loc["spellingLoc"]
+    if spelling_loc is None:
+        # added by the filter
+        return {key: field for key, field in loc.items() if key != "spellingLoc"}
+    # a location in a macro expansion
+    raw_spelling_loc: Dict[str, Any] = {
+        "offset": 1,
+        "file": "/ws/include/ginac/archive.h",
+        "line": 2,
+        "col": 3,
+        "tokLen": 4,
+    }
+    if "includedFrom" in spelling_loc:
+        raw_spelling_loc["includedFrom"] = {
+            "file": "/ws/include/" + spelling_loc["includedFrom"]
+        }
+    return {"spellingLoc": raw_spelling_loc, "expansionLoc": {"offset": 5}}
+
+
+class TestAstJson(unittest.TestCase):
+    def test_shorten_as_dump_jq(self):
+        for fixture in SHORT_FIXTURES:
+            with self.subTest(fixture=fixture):
+                expected = json.loads((dir_fixture / fixture).read_text())
+                # already shortened entities are kept as they are
+                self.assertEqual(
+                    [shorten(copy.deepcopy(e)) for e in expected], expected
+                )
+
+                dump = {
+                    "id": "0x0",
+                    "kind": "TranslationUnitDecl",
+                    "inner": [
+                        {"kind": "NamespaceDecl", "name": "std", "inner": expected},
+                        {
+                            "kind": "NamespaceDecl",
+                            "name": "GiNaC",
+                            "inner": [
+                                {
+                                    "kind": "CXXRecordDecl",
+                                    "tagUsed": "class",
+                                    "loc": {"includedFrom": {"file": "/ws/a.h"}},
+                                    "inner": [],
+                                },
+                                {"kind": "EnumDecl", "loc": {}, "inner": []},
+                                *to_raw(expected),
+                            ],
+                        },
+                    ],
+                }
+                with tempfile.TemporaryDirectory() as dir_temp:
+                    dump_file = Path(dir_temp) / "dump.json"
+                    dump_file.write_text(json.dumps(dump), encoding="utf-8")
+                    short_file = Path(dir_temp) / "short.json"
+                    self.assertEqual(shorten_dump(dump_file, short_file), len(expected))
+                    self.assertEqual(json.loads(short_file.read_text()), expected)
+
+    def test_collect(self):
+        # the shortened fixture gives the same interface as parsing the header with libclang
+        collector = AstJsonCollector()
+        collector.collect(dir_fixture / "ginac-symbol-h-short.json", {"symbol"})
+        symbol = collector.data["Symbol"]
+        symbol.namespace = "Ginac"
+        expected = (dir_fixture / "Symbol.yml").read_text(encoding="utf-8")
+        self.assertEqual(symbol, load_interface(expected))
+        self.assertMultiLineEqual(dump_interface(symbol), expected)
+        # a reference to the internals can't be returned along with the receiver
+        owned = {method.cpp for method in symbol.type.methods if method.own}
+        self.assertEqual(owned, {"read_archive", "set_name", "set_TeX_name"})
+
+        def loc(line: int, included_from: Optional[str] = None) -> Dict[str, Any]:
+            loc = {"offset": 0, "file": "/ws/include/ginac/symbol.h", "line": line}
+            if included_from is not None:
+                loc["includedFrom"] = {"file": included_from}
+            return loc
+
+        dump = {
+            "id": "0x1",
+            "kind": "TranslationUnitDecl",
+            "inner": [
+                {
+                    "kind": "NamespaceDecl",
+                    "name": "std",
+                    "inner": [{"kind": "FunctionDecl", "name": "f"}],
+                },
+                {
+                    "id": "0x2",
+                    "kind": "NamespaceDecl",
+                    "name": "GiNaC",
+                    "inner": [
+                        {
+                            "kind": "CXXRecordDecl",
+                            "name": "basic",
+                            "tagUsed": "class",
+                            "loc": loc(1, "/ws/include/ginac/symbol.h"),
+                            "inner": [],
+                        },
+                        {
+                            "id": "0x3",
+                            "kind": "CXXRecordDecl",
+                            "name": "symbol",
+                            "tagUsed": "class",
+                            "loc": loc(10),
+                            "range": {},
+                            "inner": [
+                                {
+                                    "kind": "CXXConstructorDecl",
+                                    "name": "symbol",
+                                    "loc": loc(11),
+                                    "type": {"qualType": "void ()"},
+                                },
+                                {"kind": "AccessSpecDecl", "access": "public"},
+                                {
+                                    "kind": "CXXConstructorDecl",
+                                    "name": "symbol",
+                                    "loc": loc(13),
+                                    "type": {"qualType": "void (const std::string &)"},
+                                    "inner": [
+                                        {
+                                            "kind": "ParmVarDecl",
+                                            "name": "n",
+                                            "type": {"qualType": "const std::string &"},
+                                            "inner": [{"kind": "StringLiteral"}],
+                                        },
+                                        {"kind": "CompoundStmt"},
+                                    ],
+                                },
+                                {
+                                    "kind": "CXXMethodDecl",
+                                    "name": "get_domain",
+                                    "type": {"qualType": "unsigned int () const"},
+                                },
+                                {
+                                    "kind": "CXXMethodDecl",
+                                    "name": "operator=",
+                                    "isImplicit": True,
+                                    "type": {"qualType": "symbol &(const symbol &)"},
+                                },
+                            ],
+                        },
+                    ],
+                },
+            ],
+        }
+
+        with tempfile.TemporaryDirectory() as dir_temp:
+            dump_file = Path(dir_temp) / "symbol.json"
+            dump_file.write_text(json.dumps(dump), encoding="utf-8")
+
+            entities = list(iter_entities(dump_file))
+            self.assertEqual([entity["name"] for entity in entities], ["symbol"])
+            self.assertNotIn("id", entities[0])
+            self.assertNotIn("range", entities[0])
+            # the default argument of a parameter is kept, the body is not
+            constructor = entities[0]["inner"][2]
+            self.assertEqual(
+                [inner["kind"] for inner in constructor["inner"]], ["ParmVarDecl"]
+            )
+            self.assertEqual(
+                constructor["inner"][0]["inner"], [{"kind": "StringLiteral"}]
+            )
+            # only the `spellingLoc` loses its position
+            self.assertEqual(
+                constructor["loc"],
+                {
+                    "offset": 0,
+                    "file": "/ws/include/ginac/symbol.h",
+                    "line": 13,
+                    "spellingLoc": None,
+                },
+            )
+
+            # a shortened dump can be read again
+            short_file = Path(dir_temp) / "symbol-short.json"
+            self.assertEqual(shorten_dump(dump_file, short_file), 1)
+            self.assertEqual(list(iter_entities(short_file)), entities)
+
+            collector = AstJsonCollector()
+            methods = collector.collect(dump_file)["Symbol"].type.methods
+            self.assertEqual(
+                [method.cpp for method in methods], ["symbol", "get_domain"]
+            )
+            self.assertEqual(methods[0].params[0].type.lean, "@&String")
+            self.assertEqual(methods[1].return_type.lean, "UInt32")
+
+
+if __name__ == "__main__":
+    unittest.main()
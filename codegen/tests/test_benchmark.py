@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import json
+import os
+import unittest
+
+import pytest
+from utils.benchmark import (
+    BASELINE_FILE,
+    BENCHMARK_ENV,
+    RESULTS_FILE,
+    find_regressions,
+    run_benchmarks,
+)
+
+
+class TestBenchmark(unittest.TestCase):
+    # run with
+    # GINAC_LEAN_BENCHMARK=1 pytest codegen/tests -k benchmark -s
+    # and store the results as the baseline with
+    # cd codegen && python -m utils.benchmark --update-baseline
+    @pytest.mark.skipif(
+        BENCHMARK_ENV not in os.environ, reason=f"only run with {BENCHMARK_ENV} set"
+    )
+    def test_benchmark(self):
+        benchmark = run_benchmarks()
+        benchmark.save(RESULTS_FILE)
+
+        results = benchmark.to_dict()
+        for stage in [
+            "read_ast_json",
+            "type_mapping",
+            "to_dict",
+            "yaml_dump",
+            "render",
+        ]:
+            self.assertIn(stage, results["stages"])
+
+        if not BASELINE_FILE.exists():
+            self.skipTest(f"no baseline to compare with, {BASELINE_FILE} not found")
+        baseline = json.loads(BASELINE_FILE.read_text(encoding="utf-8"))
+        self.assertEqual(find_regressions(results, baseline), [])
+
+    def test_find_regressions(self):
+        baseline = {
+            "peak_rss_kb": 100000,
+            "stages": {"parse": {"seconds": 1.0}, "render": {"seconds": 0.001}},
+        }
+        results = {
+            "peak_rss_kb": 110000,
+            "stages": {
+                "parse": {"seconds": 1.4},
+                # far slower, but within the noise of short stages
+                "render": {"seconds": 0.01},
+                "walk": {"seconds": 5.0},
+            },
+        }
+        self.assertEqual(find_regressions(results, baseline), [])
+
+        results["stages"]["parse"]["seconds"] = 1.6
+        results["peak_rss_kb"] = 200000
+        self.assertEqual(
+            find_regressions(results, baseline),
+            [
+                "parse took 1.600s, baseline 1.000s",
+                "peak RSS 200000 KB, baseline 100000 KB",
+            ],
+        )
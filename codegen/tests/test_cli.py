@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import os
+import subprocess  # nosec
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from utils.cli import main
+from utils.serialize import load_interface, save_interfaces
+
+dir_root: Path = Path(os.path.dirname(os.path.realpath(__file__))).parent.parent
+dir_codegen: Path = dir_root / "codegen"
+dir_fixture: Path = dir_codegen / "tests" / "fixtures"
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self) -> None:
+        self.symbol = load_interface(
+            (dir_fixture / "Symbol.yml").read_text(encoding="utf-8")
+        )
+
+    def test_render_imports_no_libclang(self):
+        # in a fresh interpreter, as other tests have already imported libclang here
+        code = (
+            "import sys, utils.cli, utils.generate, utils.serialize; "
+            "print(sorted(m for m in sys.modules if m.startswith('clang')))"
+        )
+        output = subprocess.run(  # nosec
+            [sys.executable, "-c", code],
+            cwd=dir_codegen,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        self.assertEqual(output.strip(), "[]")
+
+    def test_render(self):
+        with tempfile.TemporaryDirectory() as dir_temp:
+            dir_out = Path(dir_temp)
+            save_interfaces([self.symbol], dir_out / "interfaces.jsonl")
+            argv = [
+                "render",
+                "--input",
+                str(dir_out / "interfaces.jsonl"),
+                "--out-dir",
+                str(dir_out),
+                "--manifest",
+                str(dir_out / "manifest.json"),
+            ]
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(main(argv), 0)
+            self.assertTrue((dir_out / "cpp" / "Symbol.cpp").exists())
+            self.assertTrue((dir_out / "lean" / "Ginac" / "Symbol.lean").exists())
+
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(main(argv), 0)
+            self.assertIn("0 files written for 1 classes", output.getvalue())
+
+    def test_diff(self):
+        with tempfile.TemporaryDirectory() as dir_temp:
+            old_file = Path(dir_temp) / "old.yml"
+            new_file = Path(dir_temp) / "new.yml"
+            save_interfaces([self.symbol], old_file)
+            save_interfaces([self.symbol], new_file)
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                self.assertEqual(main(["diff", str(old_file), str(new_file)]), 0)
+            self.assertEqual(output.getvalue(), "")
+
+            get_name = next(
+                method
+                for method in self.symbol.type.methods
+                if method.cpp == "get_name"
+            )
+            self.symbol.type.methods.remove(get_name)
+            save_interfaces([self.symbol], new_file)
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                self.assertEqual(main(["diff", str(old_file), str(new_file)]), 1)
+            self.assertEqual(
+                output.getvalue().splitlines(),
+                ["- Symbol: std::string get_name()"],
+            )
+
+    def test_parse_batch(self):
+        with tempfile.TemporaryDirectory() as dir_temp:
+            dir_out = Path(dir_temp)
+            header = dir_out / "symbol.h"
+            header.write_text(
+                "namespace GiNaC {\n"
+                "class symbol {\n"
+                "public:\n"
+                "    symbol(const char * name);\n"
+                "    unsigned serial(bool twice) const;\n"
+                "    void set_serial(unsigned serial);\n"
+                "};\n"
+                "}\n",
+                encoding="utf-8",
+            )
+            interfaces_file = dir_out / "interfaces.yml"
+            argv = ["parse", str(header), "--output", str(interfaces_file)]
+            for spec in ["symbol::symbol", "symbol::serial", "symbol::set_serial"]:
+                argv += ["--batch", spec]
+            with contextlib.redirect_stdout(io.StringIO()):
+                with contextlib.redirect_stderr(io.StringIO()) as error:
+                    self.assertEqual(main(argv + ["--batch", "numeric::abs"]), 0)
+            # mutating methods can't be batched
+            self.assertEqual(
+                error.getvalue().splitlines(),
+                [
+                    "WARN Can't batch symbol::set_serial, it's static, mutating or without arguments",
+                    "WARN Can't batch methods of numeric, not collected",
+                ],
+            )
+
+            argv = ["render", "--input", str(interfaces_file), "--out-dir", dir_temp]
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(main(argv), 0)
+            cpp = (dir_out / "cpp" / "Symbol.cpp").read_text(encoding="utf-8")
+            lean = (dir_out / "lean" / "Ginac" / "Symbol.lean").read_text(
+                encoding="utf-8"
+            )
+        self.assertIn(
+            "lean_obj_res Ginac_Symbol_mkBatch(b_lean_obj_arg _arg_name)", cpp
+        )
+        self.assertIn(
+            "make_cppClass<symbol>(lean_string_cstr(_arg_name_cptr[_i]));", cpp
+        )
+        self.assertIn(
+            "lean_obj_res Ginac_Symbol_serialBatch(b_lean_obj_arg _selfs, uint8_t _arg_twice)",
+            cpp,
+        )
+        self.assertIn("_ret_cptr[_i] = lean_box_uint32(_ret_unsigned_int);", cpp)
+        self.assertNotIn("set_serialBatch", cpp)
+        self.assertIn(
+            "opaque Symbol.mkBatch (name : @& Array String) : Array Symbol", lean
+        )
+        self.assertIn(
+            "opaque Symbol.serialBatch (selfs : @& Array Symbol) (twice : Bool) : Array UInt32",
+            lean,
+        )
+
+    def test_parse_batch_spec(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main(["parse", "symbol.h", "--batch", "get_name"])
+
+
+if __name__ == "__main__":
+    unittest.main()
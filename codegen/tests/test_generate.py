@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import copy
 import os
 import re
+import tempfile
 import unittest
 from pathlib import Path
 from typing import Any, Generator, Iterator, List, Optional, Sequence, Set
@@ -10,7 +12,10 @@ import pytest
 import yaml
 
 # from clang.cindex import Index, Cursor, CursorKind, TypeKind, Config, TranslationUnit, FileInclusion, AccessSpecifier
-from jinja2 import Environment, FileSystemLoader
+from utils.generate import GenerationManifest, generate
+from utils.interface import ClassType, Method, ReturnType
+from utils.render import Renderer
+from utils.serialize import load_interface
 
 dir_root: Path = Path(os.path.dirname(os.path.realpath(__file__))).parent.parent
 dir_build: Path = dir_root / "build"
@@ -20,23 +25,22 @@ dir_fixture: Path = dir_codegen / "tests" / "fixtures"
 UPDATE_FIXTURES = False
 
 
-# TODO: extract the the implemetation out of tests
 class TestGenerate(unittest.TestCase):
-    def setUp(self) -> None:
-        pass
+    renderer: Renderer
 
-    def test_generate_lean(self):
-        file_loader = FileSystemLoader(dir_codegen / "templates")
-        env = Environment(loader=file_loader, trim_blocks=True, lstrip_blocks=True)
-        template_lean = env.get_template("lean/class.lean.j2")
+    @classmethod
+    def setUpClass(cls) -> None:
+        # Templates are compiled once for all tests
+        cls.renderer = Renderer()
 
-        mock_data = yaml.safe_load(
+    def test_generate_lean(self):
+        mock_data = load_interface(
             (dir_fixture / "mock.yml").read_text(encoding="utf-8")
         )
 
         expected_lean = (dir_fixture / "mock.lean").read_text(encoding="utf-8")
 
-        actual_lean = template_lean.render(**mock_data)
+        actual_lean = self.renderer.render("lean", mock_data)
 
         if UPDATE_FIXTURES:
             (dir_fixture / "mock.lean").write_text(actual_lean, encoding="utf-8")
@@ -44,19 +48,151 @@ class TestGenerate(unittest.TestCase):
         self.assertMultiLineEqual(actual_lean, expected_lean)
 
     def test_generate_cpp(self):
-        file_loader = FileSystemLoader(dir_codegen / "templates")
-        env = Environment(loader=file_loader, trim_blocks=True, lstrip_blocks=True)
-        template_cpp = env.get_template("cpp/class.cpp.j2")
-
-        mock_data = yaml.safe_load(
+        mock_data = load_interface(
             (dir_fixture / "mock.yml").read_text(encoding="utf-8")
         )
 
         expected_cpp = (dir_fixture / "mock.cpp").read_text(encoding="utf-8")
 
-        actual_cpp = template_cpp.render(**mock_data)
+        actual_cpp = self.renderer.render("cpp", mock_data)
 
         if UPDATE_FIXTURES:
             (dir_fixture / "mock.cpp").write_text(actual_cpp, encoding="utf-8")
 
         self.assertMultiLineEqual(actual_cpp, expected_cpp)
+
+    def test_generate_incremental(self):
+        mock_data = yaml.safe_load(
+            (dir_fixture / "mock.yml").read_text(encoding="utf-8")
+        )
+        another_data = copy.deepcopy(mock_data)
+        another_data["type"]["lean"] = "Another"
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_out = Path(tmp_dir)
+            out_dirs = {"cpp": dir_out / "cpp", "lean": dir_out / "lean"}
+            manifest_file = dir_out / "manifest.json"
+            interfaces = {"Symbol": mock_data, "Another": another_data}
+
+            written = generate(
+                interfaces,
+                out_dirs,
+                GenerationManifest(manifest_file),
+                renderer=self.renderer,
+            )
+            self.assertEqual(
+                sorted(path.relative_to(dir_out).as_posix() for path in written),
+                [
+                    "cpp/Another.cpp",
+                    "cpp/Classes.cpp",
+                    "cpp/Symbol.cpp",
+                    "lean/Ginac/Another.lean",
+                    "lean/Ginac/Classes.lean",
+                    "lean/Ginac/Symbol.lean",
+                ],
+            )
+            # the classes of type_map.yml are registered along with the generated ones
+            classes_cpp = (out_dirs["cpp"] / "Classes.cpp").read_text(encoding="utf-8")
+            self.assertIn("CppClass_register<GiNaC::ex>();", classes_cpp)
+            self.assertEqual(
+                classes_cpp.count("CppClass_register<GiNaC::symbol>();"), 1
+            )
+            self.assertIn(
+                "initialize registerClasses",
+                (out_dirs["lean"] / "Ginac" / "Classes.lean").read_text(
+                    encoding="utf-8"
+                ),
+            )
+            self.assertMultiLineEqual(
+                (out_dirs["lean"] / "Ginac" / "Symbol.lean").read_text(
+                    encoding="utf-8"
+                ),
+                (dir_fixture / "mock.lean").read_text(encoding="utf-8"),
+            )
+
+            # nothing changed, nothing written
+            written = generate(
+                interfaces,
+                out_dirs,
+                GenerationManifest(manifest_file),
+                renderer=self.renderer,
+            )
+            self.assertEqual(written, [])
+
+            # only the changed class is rewritten
+            another_data["type"]["methods"][1]["lean"] = "get_name"
+            written = generate(
+                interfaces,
+                out_dirs,
+                GenerationManifest(manifest_file),
+                renderer=self.renderer,
+            )
+            self.assertEqual(
+                sorted(path.relative_to(dir_out).as_posix() for path in written),
+                ["cpp/Another.cpp", "lean/Ginac/Another.lean"],
+            )
+
+            # outputs changed behind our back are regenerated, but a file whose bytes
+            # wouldn't change is left as is
+            (out_dirs["cpp"] / "Symbol.cpp").write_text("", encoding="utf-8")
+            written = generate(
+                interfaces,
+                out_dirs,
+                GenerationManifest(manifest_file),
+                renderer=self.renderer,
+            )
+            self.assertEqual(
+                [path.relative_to(dir_out).as_posix() for path in written],
+                ["cpp/Symbol.cpp"],
+            )
+
+    def test_render_all(self):
+        mock_data = yaml.safe_load(
+            (dir_fixture / "mock.yml").read_text(encoding="utf-8")
+        )
+        interfaces = {}
+        for i in range(8):
+            interfaces[f"Class{i}"] = copy.deepcopy(mock_data)
+            interfaces[f"Class{i}"]["type"]["lean"] = f"Class{i}"
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bytecode_cache_dir = Path(tmp_dir) / "jinja"
+            renderer = Renderer(bytecode_cache_dir=bytecode_cache_dir)
+            # compiled templates, including the imported helper.j2, are cached on disk
+            self.assertGreaterEqual(len(list(bytecode_cache_dir.iterdir())), 2)
+
+            sequential = renderer.render_all(interfaces)
+            self.assertEqual(list(sequential.keys()), list(interfaces.keys()))
+            self.assertMultiLineEqual(
+                sequential["Class0"]["cpp"],
+                self.renderer.render("cpp", interfaces["Class0"]),
+            )
+
+            # a new renderer loads the compiled templates, and threads give the same result
+            renderer = Renderer(bytecode_cache_dir=bytecode_cache_dir, max_workers=4)
+            self.assertEqual(renderer.render_all(interfaces), sequential)
+            self.assertEqual(
+                renderer.render_all(interfaces, kinds=["lean"])["Class3"],
+                {"lean": sequential["Class3"]["lean"]},
+            )
+
+    def test_enable_batch(self):
+        def method(kind: str, cpp: str, **kwargs) -> Method:
+            return Method(kind, cpp, cpp, [], ReturnType("Ex", "ex", "%s"), **kwargs)
+
+        class_type = ClassType(
+            "Ex",
+            "ex",
+            [
+                method("CONSTRUCTOR", "ex"),
+                method("CXX_METHOD", "evalf", is_const=True),
+                method("CXX_METHOD", "let_op", own=True),
+                method("CXX_METHOD", "unarchive", is_static=True),
+            ],
+        )
+        class_type.enable_batch({"ex", "evalf", "let_op", "unarchive"})
+        # a constructor without arguments has nothing to map over
+        self.assertEqual(
+            [method.batch for method in class_type.methods],
+            [False, True, False, False],
+        )
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import unittest
+
+from tests.helpers import HeadersTestCase
+from utils.cli import main
+from utils.collector import ParseSession
+from utils.index import SymbolIndex
+
+HEADER_OLD = """#pragma once
+namespace cln { class cl_N { public: cl_N(); }; }
+namespace GiNaC {
+class symbol;
+/** A symbol */
+class symbol {
+public:
+    symbol(const char * name);
+    ~symbol();
+    const char * get_name() const;
+    unsigned serial() const;
+private:
+    void hidden();
+};
+typedef symbol sym;
+}
+"""
+
+HEADER_NEW = HEADER_OLD.replace(
+    "    unsigned serial() const;\n", "    unsigned serial(bool twice) const;\n"
+).replace(
+    "class symbol {\n",
+    "class symbol {\npublic:\n    void set_name(const char * name);\n",
+)
+
+
+class TestIndex(HeadersTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        for version, header in [("old", HEADER_OLD), ("new", HEADER_NEW)]:
+            self.write_header(f"{version}/symbol.h", header)
+        self.session = ParseSession(cpp_include_paths=[])
+        self.db_file = self.dir / "symbols.sqlite"
+
+    def test_index(self):
+        with SymbolIndex(self.db_file) as index:
+            header = self.dir / "old" / "symbol.h"
+            self.assertEqual(index.add("old", [header], self.session), 9)
+            # indexed again, not twice: the class, its constructor, destructor and 3 methods,
+            # the typedef, without cln
+            self.assertEqual(index.add("old", [header], self.session, ["GiNaC"]), 7)
+            self.assertEqual(index.versions(), ["old"])
+            self.assertEqual(
+                index.connection.execute(
+                    "SELECT COUNT(*) FROM declarations"
+                ).fetchone(),
+                (7,),
+            )
+
+            methods = index.methods("old", "symbol")
+            self.assertEqual(
+                [(method.name, method.signature) for method in methods],
+                [
+                    ("symbol", "symbol(const char *)"),
+                    ("get_name", "get_name() const"),
+                    ("serial", "serial() const"),
+                ],
+            )
+            self.assertEqual(
+                [(method.lean_name, method.lean_type) for method in methods],
+                [
+                    ("mk", "@&String → Symbol"),
+                    ("get_name", "String"),
+                    ("serial", "UInt32"),
+                ],
+            )
+            symbol = index.query(
+                "SELECT * FROM declarations WHERE version = ? AND name = ?",
+                ["old", "symbol"],
+            )[0]
+            self.assertEqual(
+                (symbol.kind, symbol.brief_comment, symbol.line),
+                ("CLASS_DECL", "A symbol", 6),
+            )
+
+            index.add("new", [self.dir / "new" / "symbol.h"], self.session, ["GiNaC"])
+            removed, added = index.diff("old", "new")
+            self.assertEqual(
+                [declaration.signature for declaration in removed],
+                ["serial() const"],
+            )
+            self.assertEqual(
+                [declaration.signature for declaration in added],
+                ["serial(bool) const", "set_name(const char *)"],
+            )
+
+    def test_cli(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for version in ["old", "new"]:
+                argv = ["index", str(self.dir / version / "symbol.h")]
+                argv += ["--version", version, "--db", str(self.db_file)]
+                self.assertEqual(main(argv), 0)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            self.assertEqual(
+                main(["index-diff", "old", "new", "--db", str(self.db_file)]), 1
+            )
+        self.assertEqual(
+            output.getvalue().splitlines(),
+            [
+                "- CXX_METHOD symbol::serial() const",
+                "+ CXX_METHOD symbol::serial(bool) const",
+                "+ CXX_METHOD symbol::set_name(const char *)",
+            ],
+        )
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            self.assertEqual(
+                main(["index-diff", "old", "old", "--db", str(self.db_file)]), 0
+            )
+        self.assertEqual(output.getvalue(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
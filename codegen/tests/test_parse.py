@@ -1,8 +1,9 @@
 from __future__ import annotations
 
+import json
 import os
 import re
-import sys
+import tempfile
 import unittest
 from pathlib import Path
 from typing import Any, Dict, Generator, Iterator, List, Optional, Sequence, Set
@@ -22,8 +23,10 @@ from clang.cindex import Type as CppType
 from clang.cindex import TypeKind, conf
 
 # FIXME: properly make it a package
-from utils.clang import get_cpp_include_paths
-from utils.collector import EntityCollector
+from utils.cache import TranslationUnitCache
+from utils.clang import CLANG_PATHS_CACHE_FILE, get_cpp_include_paths
+from utils.collector import EntityCollector, ParseSession
+from utils.instrument import INSTRUMENT_ENV, NullInstrumentation
 from utils.interface import (
     ClassInterface,
     ClassType,
@@ -32,16 +35,21 @@ from utils.interface import (
     ParamType,
     ReturnType,
 )
+from utils.parallel import collect_headers_in_parallel
+from utils.pch import PrecompiledHeader
+from utils.serialize import dump_interface
 from utils.types import (
     check_arg_valid,
     check_valid,
     cursor_kind_spelling,
     from_lean_function,
+    get_type_registry,
     to_lean_function,
     to_lean_method_name,
     to_lean_param_name,
     to_lean_type_name,
 )
+from utils.visitor import METHOD_CURSOR_KINDS, CursorFilter
 
 dir_root: Path = Path(os.path.dirname(os.path.realpath(__file__))).parent.parent
 dir_build: Path = dir_root / ".lake" / "build"
@@ -67,7 +75,9 @@ UPDATE_FIXTURES = "UPDATE_FIXTURES" in os.environ
 
 class TestParse(unittest.TestCase):
     def setUp(self) -> None:
-        self.collector = EntityCollector(recursive=True)
+        self.collector = EntityCollector(
+            recursive=True, cache_dir=dir_build / "codegen" / "ast"
+        )
         print(f"C++ include paths: {self.collector.cpp_include_paths}")
 
     # regenerate with
@@ -106,7 +116,7 @@ class TestParse(unittest.TestCase):
                             CursorKind.CXX_METHOD,
                         ]:
                             for arg in cursor.get_arguments():
-                                check_arg_valid(arg, file=file)
+                                check_arg_valid(arg, report=collector.arg_report)
                                 referenced = arg.referenced
                                 # check_arg_valid(referenced)
                                 print(
@@ -144,6 +154,8 @@ class TestParse(unittest.TestCase):
                                     file=file,
                                 )
 
+            collector.arg_report.print(file=file)
+
     # see output with
     # pytest codegen/tests -k parse_symbol -s
     def test_parse_symbol(self):
@@ -154,71 +166,15 @@ class TestParse(unittest.TestCase):
         ginac_ast: TranslationUnit = self.collector.parse(ginac_header)
 
         collector = self.collector
-        for cursor in collector.walk(ginac_ast):
-            if cursor.kind in concerned_cursor_kinds:
-                check_valid(cursor)
-                if (
-                    cursor.access_specifier == AccessSpecifier.PUBLIC
-                    and cursor.lexical_parent.spelling == test_target
-                ):
-                    if cursor.kind in [CursorKind.CONSTRUCTOR, CursorKind.CXX_METHOD]:
-                        class_type_name = cursor.lexical_parent.spelling
-                        class_cursor = cursor.lexical_parent
-                        class_type = collector.find_or_create_type(
-                            class_type_name, cursor.lexical_parent.type
-                        )
-
-                        return_type = (
-                            ReturnType(
-                                cpp=class_type_name,
-                                lean=to_lean_type_name(
-                                    class_type_name, class_cursor.type
-                                ),
-                                to_lean=to_lean_function(
-                                    class_type_name, class_cursor.type
-                                ),
-                            )
-                            if cursor.kind == CursorKind.CONSTRUCTOR
-                            else ReturnType(
-                                cpp=cursor.result_type.spelling,
-                                lean=to_lean_type_name(
-                                    cursor.result_type.spelling, cursor.result_type
-                                ),
-                                to_lean=to_lean_function(
-                                    cursor.result_type.spelling, cursor.result_type
-                                ),
-                            )
-                        )
-
-                        method = Method(
-                            kind=cursor_kind_spelling(cursor.kind),
-                            cpp=cursor.spelling,
-                            lean=to_lean_method_name(cursor.spelling, cursor),
-                            params=[],
-                            return_type=return_type,
-                        )
-
-                        method.params = [
-                            MethodParam(
-                                name=arg.spelling,
-                                type=ParamType(
-                                    cpp=arg.type.spelling,
-                                    lean=to_lean_param_name(arg),
-                                    from_lean=from_lean_function(
-                                        arg.type.spelling, arg
-                                    ),
-                                ),
-                            )
-                            for arg in cursor.get_arguments()
-                        ]
-                        class_type.methods.append(method)
+        collector.collect(ginac_ast, {test_target})
+        get_type_registry().print_summary()
 
         for class_name, class_interface in collector.data.items():
             if class_name == to_lean_type_name(test_target):
                 class_interface.namespace = "Ginac"
                 target_fixture = dir_fixture / f"{class_name}.yml"
 
-                actual = yaml.dump(class_interface.to_dict())
+                actual = dump_interface(class_interface)
                 expected = target_fixture.read_text()
 
                 if UPDATE_FIXTURES:
@@ -226,5 +182,398 @@ class TestParse(unittest.TestCase):
 
                 self.assertMultiLineEqual(actual, expected)
 
+    def test_walk_single_parse(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_headers = Path(tmp_dir)
+            (dir_headers / "b.h").write_text(
+                "#pragma once\nnamespace GiNaC { class b {}; }\n"
+            )
+            (dir_headers / "a.h").write_text(
+                '#pragma once\n#include <string>\n#include "b.h"\nnamespace GiNaC { class a { public: a(const std::string &n); }; }\n'
+            )
+            (dir_headers / "main.h").write_text(
+                '#include "a.h"\n#include "b.h"\nnamespace GiNaC { class main : public a {}; }\n'
+            )
+
+            collector = self.collector
+            ast: TranslationUnit = collector.parse(dir_headers / "main.h")
+
+            class_files = [
+                Path(cursor.location.file.name).name
+                for cursor in collector.walk(ast)
+                if cursor.kind == CursorKind.CLASS_DECL
+            ]
+
+            # every class is walked exactly once, and nothing from <string>
+            self.assertEqual(sorted(class_files), ["a.h", "b.h", "main.h"])
+            self.assertIn(str(dir_headers / "a.h"), collector.visited_headers)
+            self.assertIn(str(dir_headers / "b.h"), collector.visited_headers)
+
+            # headers already visited are skipped in later walks
+            class_files = [
+                Path(cursor.location.file.name).name
+                for cursor in collector.walk(ast)
+                if cursor.kind == CursorKind.CLASS_DECL
+            ]
+            self.assertEqual(class_files, ["main.h"])
+
+    def test_walk_pruned(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_headers = Path(tmp_dir)
+            (dir_headers / "main.h").write_text(
+                """#include <string>
+namespace cln { class cl_N { public: cl_N(); }; }
+class global { public: global(); };
+namespace GiNaC {
+class a {
+public:
+    a(const std::string &n);
+    int f() const { int x = 0; return x; }
+    int f2();
+    struct inner { inner(); };
+protected:
+    void g();
+private:
+    struct hidden { hidden(); };
+};
+class b { public: b(); };
+namespace detail { class c { public: c(); }; }
+inline int a::f2() { return 0; }
+}
+"""
+            )
+            ast: TranslationUnit = self.collector.parse(dir_headers / "main.h")
+
+            def walk(cursor_filter: CursorFilter) -> List[str]:
+                collector = EntityCollector(
+                    recursive=True, session=self.collector.session
+                )
+                return [
+                    f"{cursor.semantic_parent.spelling}::{cursor.spelling}"
+                    for cursor in collector.walk(ast, cursor_filter)
+                ]
+
+            self.assertEqual(
+                walk(CursorFilter(METHOD_CURSOR_KINDS)),
+                [
+                    "cl_N::cl_N",
+                    "global::global",
+                    "a::a",
+                    "a::f",
+                    "a::f2",
+                    "inner::inner",
+                    "b::b",
+                    "c::c",
+                    # out-of-line
+                    "a::f2",
+                ],
+            )
+            self.assertEqual(
+                walk(
+                    CursorFilter(
+                        METHOD_CURSOR_KINDS,
+                        namespaces=frozenset({"GiNaC"}),
+                        classes=frozenset({"a", "c"}),
+                    )
+                ),
+                ["a::a", "a::f", "a::f2", "c::c", "a::f2"],
+            )
+            self.assertEqual(
+                walk(
+                    CursorFilter(
+                        frozenset({CursorKind.CXX_METHOD}),
+                        access=None,
+                        namespaces=frozenset({"GiNaC"}),
+                    )
+                ),
+                ["a::f", "a::f2", "a::g", "a::f2"],
+            )
+
+            # the same methods as a full walk filtered afterwards
+            collector = EntityCollector(
+                recursive=True, session=self.collector.session, namespaces={"GiNaC"}
+            )
+            collector.collect(ast)
+            self.assertEqual(list(collector.data.keys()), ["A", "Inner", "B", "C"])
+            self.assertEqual(
+                [method.cpp for method in collector.data["A"].type.methods],
+                ["a", "f", "f2"],
+            )
+
+    def test_translation_unit_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_headers = Path(tmp_dir)
+            (dir_headers / "a.h").write_text("#pragma once\nclass a {};\n")
+            (dir_headers / "main.h").write_text('#include "a.h"\nclass main {};\n')
+
+            collector = EntityCollector(recursive=True, cache_dir=dir_headers / "cache")
+            tu_cache: TranslationUnitCache = collector.tu_cache
+            main_header = dir_headers / "main.h"
+
+            # cold
+            self.assertIsNone(
+                tu_cache.load(collector.index, main_header, collector.index_args)
+            )
+            ast: TranslationUnit = collector.parse(main_header)
+
+            # warm
+            cached_ast = tu_cache.load(
+                collector.index, main_header, collector.index_args
+            )
+            self.assertIsNotNone(cached_ast)
+            self.assertEqual(
+                [cursor.spelling for cursor in cached_ast.cursor.get_children()][-2:],
+                [cursor.spelling for cursor in ast.cursor.get_children()][-2:],
+            )
+
+            # a different index_args is a different entry
+            self.assertIsNone(
+                tu_cache.load(
+                    collector.index, main_header, collector.index_args + ["-DX"]
+                )
+            )
+
+            # touching an include keeps the entry valid, and records the new mtime
+            os.utime(dir_headers / "a.h", ns=(0, 0))
+            self.assertTrue(tu_cache.is_valid(main_header, collector.index_args))
+            manifest = tu_cache.read_manifest(main_header, collector.index_args)
+            self.assertEqual(
+                [dep["mtime_ns"] for dep in manifest["deps"]][-1],
+                os.stat(dir_headers / "a.h").st_mtime_ns,
+            )
+            self.assertEqual(list((dir_headers / "cache").glob("*.tmp")), [])
+
+            # changing a transitive include invalidates the entry
+            (dir_headers / "a.h").write_text("#pragma once\nclass a { int x; };\n")
+            self.assertIsNone(
+                tu_cache.load(collector.index, main_header, collector.index_args)
+            )
+
+    def test_collect_headers_in_parallel(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_headers = Path(tmp_dir)
+            (dir_headers / "common.h").write_text(
+                "#pragma once\nnamespace GiNaC { class common { public: common(); bool info(unsigned inf) const; }; }\n"
+            )
+            headers = []
+            for name in ["a", "b", "c"]:
+                (dir_headers / f"{name}.h").write_text(
+                    f'#include "common.h"\nnamespace GiNaC {{ class {name} : public common {{ public: {name}(); }}; }}\n'
+                )
+                headers.append(dir_headers / f"{name}.h")
+
+            collector = self.collector
+            data = collect_headers_in_parallel(collector, headers, max_workers=2)
+
+            self.assertEqual(list(data.keys()), ["Common", "A", "B", "C"])
+            self.assertEqual(
+                [method.cpp for method in data["Common"].type.methods],
+                ["common", "info"],
+            )
+            self.assertEqual([method.lean for method in data["B"].type.methods], ["mk"])
+
+    def test_cpp_include_paths_cache(self):
+        include_paths = get_cpp_include_paths()
+        self.assertEqual(self.collector.cpp_include_paths, include_paths)
+        self.assertTrue(CLANG_PATHS_CACHE_FILE.exists())
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_file = Path(tmp_dir) / "clang-paths.json"
+            # A fake clang logging how it is run
+            log_file = Path(tmp_dir) / "clang.log"
+            fake_clang = Path(tmp_dir) / "clang"
+            fake_clang.write_text(
+                "#!/bin/sh\n"
+                f'echo "$1" >> {log_file}\n'
+                'if [ "$1" = --version ]; then echo "clang version 1.0.0"; exit; fi\n'
+                "printf '#include <...> search starts here:\\n /probed\\nEnd of search list.\\n' >&2\n"
+            )
+            fake_clang.chmod(0o755)
+
+            def cache_entry(version: str) -> str:
+                entry = {
+                    "mtime_ns": os.stat(fake_clang).st_mtime_ns,
+                    "version": version,
+                    "include_paths": ["/cached"],
+                }
+                return json.dumps({str(fake_clang): entry})
+
+            # a hit in the cache file only asks for the version, and then once per process
+            cache_file.write_text(cache_entry("clang version 1.0.0"))
+            for _ in range(2):
+                self.assertEqual(
+                    get_cpp_include_paths(str(fake_clang), cache_file=cache_file),
+                    ["/cached"],
+                )
+            self.assertEqual(log_file.read_text().split(), ["--version"])
+
+            # another version is a miss
+            os.utime(fake_clang, ns=(0, 0))
+            cache_file.write_text(cache_entry("clang version 0.0.0"))
+            self.assertEqual(
+                get_cpp_include_paths(str(fake_clang), cache_file=cache_file),
+                ["/probed"],
+            )
+            self.assertEqual(
+                log_file.read_text().split(), ["--version", "--version", "-v"]
+            )
+            self.assertEqual(
+                json.loads(cache_file.read_text())[str(fake_clang)]["version"],
+                "clang version 1.0.0",
+            )
+
+    def test_collectors_sharing_session(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_headers = Path(tmp_dir)
+            (dir_headers / "common.h").write_text(
+                "#pragma once\nclass common { public: common(); };\n"
+            )
+            (dir_headers / "main.h").write_text(
+                '#include "common.h"\nclass main { public: main(); };\n'
+            )
+
+            session = ParseSession(cpp_include_paths=self.collector.cpp_include_paths)
+            collectors = [
+                EntityCollector(recursive=True, session=session) for _ in range(3)
+            ]
+
+            # state is per collector, and args don't grow with every new collector
+            self.assertEqual(collectors[0].index_args, collectors[2].index_args)
+            self.assertEqual(
+                len(self.collector.index_args), len(collectors[0].index_args)
+            )
+            self.assertIsNot(collectors[0].data, collectors[1].data)
+            self.assertIsNot(
+                collectors[0].visited_headers, collectors[1].visited_headers
+            )
+
+            # the translation unit is parsed once, and every collector walks it fully
+            main_header = dir_headers / "main.h"
+            for collector in collectors:
+                ast: TranslationUnit = collector.parse(main_header)
+                self.assertIs(ast, session.parse(main_header))
+                collector.collect(ast)
+                self.assertEqual(list(collector.data.keys()), ["Common", "Main"])
+
+    def test_instrumentation(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_headers = Path(tmp_dir)
+            (dir_headers / "a.h").write_text(
+                "#pragma once\nclass a { public: a(int n); int f() const; };\n"
+            )
+            (dir_headers / "main.h").write_text(
+                '#include "a.h"\nclass main { public: main(); };\n'
+            )
+            main_header = dir_headers / "main.h"
+
+            # disabled by default, by a null object
+            if INSTRUMENT_ENV not in os.environ:
+                self.assertIsInstance(
+                    self.collector.instrumentation, NullInstrumentation
+                )
+            collector = EntityCollector(
+                recursive=True, cache_dir=dir_headers / "cache", instrument=False
+            )
+            self.assertIsInstance(collector.instrumentation, NullInstrumentation)
+            collector.collect(collector.parse(main_header))
+
+            collector = EntityCollector(
+                recursive=True, cache_dir=dir_headers / "cache", instrument=True
+            )
+            instrumentation = collector.instrumentation
+            ast = collector.parse(main_header)
+            collector.parse(main_header)
+            collector.collect(ast)
+            # a.h was visited by the first walk
+            list(collector.walk(ast))
+
+            report = instrumentation.to_dict()
+            self.assertEqual(report["counters"]["tu_cache_hits"], 1)
+            self.assertEqual(report["counters"]["parse_memo_hits"], 1)
+            self.assertEqual(report["counters"]["methods_collected"], 3)
+            self.assertEqual(report["counters"]["reparses_avoided"], 1)
+            self.assertEqual(report["cursor_kinds"]["CONSTRUCTOR"], 3)
+            self.assertEqual(report["cursor_kinds"]["CXX_METHOD"], 1)
+            self.assertIn("walk", report["headers"][str(main_header)])
+            for phase in ["tu_cache_load", "walk", "collect_method", "check_arg_valid"]:
+                self.assertIn(phase, report["timers"])
+
+            report_file = dir_headers / "instrument.json"
+            instrumentation.save(report_file)
+            self.assertEqual(
+                json.loads(report_file.read_text(encoding="utf-8")), report
+            )
+
+    def test_check_arg_valid(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_headers = Path(tmp_dir)
+            # `unknown_string` can't be resolved, so libclang falls back to int
+            (dir_headers / "main.h").write_text(
+                "class main {\npublic:\n  main(const unknown_string &name, int order, unsigned inf);\n};\n"
+            )
+
+            collector = EntityCollector(
+                recursive=True, session=ParseSession(cpp_include_paths=[])
+            )
+            collector.collect(collector.parse(dir_headers / "main.h"))
+
+            report = collector.arg_report
+            self.assertEqual(report.checked, 3)
+            # all arguments are on the line of the error, so all get tokenized,
+            # but only the one that fell back to int is reported
+            self.assertEqual(report.tokenized, 3)
+            self.assertEqual(
+                [(warning.line, warning.column) for warning in report.warnings],
+                [(3, 30)],
+            )
+
+            (dir_headers / "valid.h").write_text(
+                "class valid {\npublic:\n  valid(int order);\n};\n"
+            )
+            collector.collect(collector.parse(dir_headers / "valid.h"))
+            # no errors, no tokenizing
+            self.assertEqual(report.checked, 4)
+            self.assertEqual(report.tokenized, 3)
+
+    def test_precompiled_header(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_headers = Path(tmp_dir)
+            (dir_headers / "ginac").mkdir()
+            (dir_headers / "ginac" / "basic.h").write_text(
+                "#pragma once\n#include <string>\nnamespace GiNaC { class basic { public: basic(); }; }\n"
+            )
+            (dir_headers / "ginac" / "symbol.h").write_text(
+                '#include "basic.h"\nnamespace GiNaC { class symbol : public basic { public: symbol(const std::string &n); }; }\n'
+            )
+
+            pch = PrecompiledHeader(
+                dir_headers / "pch", includes=["string", "ginac/basic.h"]
+            )
+            collector = EntityCollector(
+                recursive=True,
+                session=ParseSession(
+                    cpp_include_paths=self.collector.cpp_include_paths,
+                    include_dirs=[dir_headers],
+                    pch=pch,
+                ),
+            )
+            self.assertIn("-include-pch", collector.index_args)
+            self.assertTrue(pch.is_up_to_date(collector.index_args[:-2]))
+
+            ast: TranslationUnit = collector.parse(dir_headers / "ginac" / "symbol.h")
+            self.assertEqual(list(ast.diagnostics), [])
+            collector.collect(ast)
+            self.assertEqual(list(collector.data.keys()), ["Basic", "Symbol"])
+            self.assertEqual(
+                collector.data["Symbol"].type.methods[0].params[0].type.lean,
+                "@&String",
+            )
+
+            # changing a header in the prefix outdates the precompiled header
+            (dir_headers / "ginac" / "basic.h").write_text(
+                "#pragma once\n#include <string>\nnamespace GiNaC { class basic { public: basic(int); }; }\n"
+            )
+            self.assertFalse(pch.is_up_to_date(collector.index_args[:-2]))
+
     def test_libclang(self):
         print(conf.lib)
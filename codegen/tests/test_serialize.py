@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from utils.interface import ClassInterface, MethodParam
+from utils.serialize import (
+    FORMAT_BINARY,
+    FORMAT_JSON,
+    FORMAT_PICKLE,
+    FORMAT_YAML,
+    SUFFIXES_BY_FORMAT,
+    dump_interface,
+    dump_interfaces,
+    iter_interfaces,
+    load_interface,
+    load_interfaces,
+    save_interfaces,
+)
+
+dir_root: Path = Path(os.path.dirname(os.path.realpath(__file__))).parent.parent
+dir_fixture: Path = dir_root / "codegen" / "tests" / "fixtures"
+
+
+class TestSerialize(unittest.TestCase):
+    def setUp(self) -> None:
+        self.symbol: ClassInterface = load_interface(
+            (dir_fixture / "Symbol.yml").read_text(encoding="utf-8")
+        )
+        self.mock: ClassInterface = load_interface(
+            (dir_fixture / "mock.yml").read_text(encoding="utf-8")
+        )
+
+    def test_round_trip(self):
+        self.assertEqual(self.symbol.type.methods[0].cpp, "get_class_info_static")
+        self.assertTrue(self.symbol.type.methods[0].is_static)
+        # a handwritten interface gets the defaults of what it leaves out
+        self.assertEqual(self.mock.type.methods[0].return_type.to_lean, "%s")
+        self.assertFalse(self.mock.type.methods[0].own)
+
+        for fmt in [FORMAT_YAML, FORMAT_JSON, FORMAT_PICKLE, FORMAT_BINARY]:
+            for interface in [self.symbol, self.mock]:
+                self.assertEqual(
+                    load_interface(dump_interface(interface, fmt), fmt), interface
+                )
+        with self.assertRaises(TypeError):
+            load_interface(dump_interface(self.symbol, FORMAT_JSON), FORMAT_PICKLE)
+
+    def test_stream(self):
+        interfaces = [self.symbol, self.mock, self.symbol]
+
+        stream = io.StringIO()
+        self.assertEqual(dump_interfaces(interfaces, stream, FORMAT_YAML), 3)
+        stream.seek(0)
+        # one class at a time
+        iterator = iter_interfaces(stream, FORMAT_YAML)
+        self.assertEqual(next(iterator), self.symbol)
+        self.assertEqual(list(iterator), interfaces[1:])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for fmt in [FORMAT_YAML, FORMAT_JSON, FORMAT_PICKLE, FORMAT_BINARY]:
+                path = Path(tmp_dir) / f"interfaces{SUFFIXES_BY_FORMAT[fmt]}"
+                save_interfaces(iter(interfaces), path)
+                self.assertEqual(list(load_interfaces(path)), interfaces)
+
+    def test_interned_types(self):
+        # parameters of the same type share one immutable, slotted type object
+        params = [
+            param
+            for method in self.symbol.type.methods
+            for param in method.params
+            if param.type.cpp == "const std::string &"
+        ]
+        self.assertGreater(len(params), 1)
+        for param in params:
+            self.assertIs(param.type, params[0].type)
+        self.assertIs(
+            self.symbol.type.methods[1].return_type,
+            load_interface(dump_interface(self.symbol)).type.methods[1].return_type,
+        )
+        self.assertFalse(hasattr(params[0], "__dict__"))
+        self.assertFalse(hasattr(self.symbol.type.methods[0], "__dict__"))
+        self.assertEqual(
+            hash(params[0]), hash(MethodParam(params[0].name, params[0].type))
+        )
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import io
+import json
+import shutil
+import unittest
+from pathlib import Path
+
+from tests.helpers import HeadersTestCase
+from utils.collector import ParseSession
+from utils.generate import GenerationManifest
+from utils.render import dir_templates
+from utils.server import CodegenServer, serve_stream
+from utils.type_map import TYPE_MAP_FILE
+from utils.types import reload_type_registry
+
+HEADER_A = """#pragma once
+namespace GiNaC {
+class a {
+public:
+    a(int x);
+    int get() const;
+    bool same(const a & other) const;
+};
+}
+"""
+
+
+class TestServer(HeadersTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.write_header("a.h", HEADER_A)
+        self.write_header("main.h", '#include "a.h"\n')
+        shutil.copytree(dir_templates, self.dir / "templates")
+        shutil.copy(TYPE_MAP_FILE, self.dir / "type_map.yml")
+        self.out_dirs = {"cpp": self.dir / "cpp", "lean": self.dir / "lean"}
+        self.server = CodegenServer(
+            [self.dir / "main.h"],
+            self.out_dirs,
+            class_names={"a"},
+            session=ParseSession(),
+            manifest=GenerationManifest(self.dir / "manifest.json"),
+            templates_dir=self.dir / "templates",
+            type_map_file=self.dir / "type_map.yml",
+        )
+
+    def tearDown(self) -> None:
+        # the server reloads the shared registry from its own copy of the table
+        reload_type_registry()
+        super().tearDown()
+
+    def test_build(self):
+        server = self.server
+        cpp_file = str(self.out_dirs["cpp"] / "A.cpp")
+        lean_file = str(self.out_dirs["lean"] / "Ginac" / "A.lean")
+        classes_cpp_file = str(self.out_dirs["cpp"] / "Classes.cpp")
+        classes_lean_file = str(self.out_dirs["lean"] / "Ginac" / "Classes.lean")
+
+        result = server.build()
+        self.assertTrue(result["collected"])
+        self.assertEqual(
+            sorted(result["written"]),
+            [cpp_file, classes_cpp_file, lean_file, classes_lean_file],
+        )
+
+        # nothing changed, nothing done
+        result = server.build()
+        self.assertEqual(result["reparsed"], [])
+        self.assertFalse(result["collected"])
+        self.assertEqual(result["written"], [])
+
+        # an included header changed, the unit is reparsed in place
+        unit = server.session.units[server.headers[0]]
+        self.write_header(
+            "a.h",
+            HEADER_A.replace(
+                "int get() const;", "int get() const;\n    int twice() const;"
+            ),
+        )
+        result = server.build()
+        self.assertEqual(result["reparsed"], server.headers)
+        self.assertIs(server.session.units[server.headers[0]], unit)
+        self.assertIn("twice", Path(cpp_file).read_text(encoding="utf-8"))
+
+        # a template changed, only rendered again
+        template = self.dir / "templates" / "cpp" / "class.cpp.j2"
+        template.write_text(
+            template.read_text(encoding="utf-8").replace(
+                "#include <algorithm>\n", "#include <algorithm>\n// edited\n"
+            ),
+            encoding="utf-8",
+        )
+        result = server.build()
+        self.assertTrue(result["templates_reloaded"])
+        self.assertEqual(result["reparsed"], [])
+        self.assertFalse(result["collected"])
+        self.assertEqual(result["written"], [cpp_file])
+
+        # the type map changed, collected again without reparsing
+        self.assertIn("UNKOWN_LEAN_PARAM_NAME", Path(lean_file).read_text("utf-8"))
+        type_map = self.dir / "type_map.yml"
+        type_map.write_text(
+            type_map.read_text(encoding="utf-8").replace(
+                "classes:\n", "classes:\n  - a\n"
+            ),
+            encoding="utf-8",
+        )
+        result = server.build()
+        self.assertTrue(result["type_map_reloaded"])
+        self.assertTrue(result["collected"])
+        self.assertEqual(result["reparsed"], [])
+        self.assertIn("(other : @&A)", Path(lean_file).read_text("utf-8"))
+
+    def test_serve_stream(self):
+        output = io.StringIO()
+        shutdown = serve_stream(
+            self.server,
+            io.StringIO('build\n\n{"command": "status"}\nunknown\nshutdown\nbuild\n'),
+            output,
+        )
+        self.assertTrue(shutdown)
+        responses = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(responses), 4)
+        self.assertTrue(responses[0]["ok"])
+        self.assertEqual(len(responses[0]["written"]), 4)
+        self.assertEqual(responses[1]["classes"], ["A"])
+        self.assertEqual(responses[1]["builds"], 1)
+        self.assertFalse(responses[2]["ok"])
+        self.assertTrue(responses[3]["shutdown"])
+
+
+if __name__ == "__main__":
+    unittest.main()
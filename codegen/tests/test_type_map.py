@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import io
+import unittest
+
+from utils.type_map import (
+    FORM_CONST_POINTER,
+    FORM_CONST_REF,
+    FORM_POINTER,
+    FORM_REF,
+    FORM_RVALUE_REF,
+    FORM_VALUE,
+    TYPE_MAP_FILE,
+    ReturnMapping,
+    TypeRegistry,
+    split_spelling,
+)
+from utils.types import (
+    MAP_PRIMITIVE_SPELLING_TO_TYPE_KIND,
+    MAP_PRIMITIVE_TYPE_TO_LEAN_TYPE,
+    to_lean_type_name,
+)
+
+
+class TestTypeMap(unittest.TestCase):
+    def setUp(self) -> None:
+        self.registry = TypeRegistry.load(
+            TYPE_MAP_FILE,
+            {
+                spelling: MAP_PRIMITIVE_TYPE_TO_LEAN_TYPE[kind]
+                for spelling, kind in MAP_PRIMITIVE_SPELLING_TO_TYPE_KIND.items()
+            },
+            to_lean_type_name,
+        )
+
+    def test_split_spelling(self):
+        self.assertEqual(split_spelling("unsigned int"), ("unsigned int", FORM_VALUE))
+        self.assertEqual(split_spelling("const GiNaC::ex &"), ("ex", FORM_CONST_REF))
+        self.assertEqual(split_spelling("const ex&"), ("ex", FORM_CONST_REF))
+        self.assertEqual(split_spelling("lst &"), ("lst", FORM_REF))
+        self.assertEqual(split_spelling("ex &&"), ("ex", FORM_RVALUE_REF))
+        self.assertEqual(split_spelling("const char *"), ("char", FORM_CONST_POINTER))
+        self.assertEqual(split_spelling("symbol*"), ("symbol", FORM_POINTER))
+        self.assertEqual(
+            split_spelling("const std::string &"), ("std::string", FORM_CONST_REF)
+        )
+
+    def test_lookup(self):
+        registry = self.registry
+        for spelling in ["const std::string &", "std::string", "const char *"]:
+            self.assertEqual(registry.param(spelling).lean, "@&String")
+        self.assertEqual(
+            registry.param("const std::string &").from_lean, "to_std_string(%s)"
+        )
+        self.assertEqual(
+            registry.param("const char *").from_lean, "lean_string_cstr(%s)"
+        )
+        self.assertEqual(registry.ret("std::string").to_lean, "of_std_string(%s)")
+        self.assertEqual(registry.ret("const char *").to_lean, "lean_mk_string(%s)")
+
+        self.assertEqual(registry.param("unsigned int").lean, "UInt32")
+        self.assertEqual(registry.param("const double &").from_lean, "%s")
+        self.assertEqual(registry.ret("bool"), ReturnMapping("Bool", "%s"))
+
+        for spelling in ["const ex &", "const GiNaC::ex &", "ex"]:
+            self.assertEqual(registry.param(spelling).lean, "@&Ex")
+            self.assertEqual(registry.param(spelling).from_lean, "*to_cppClass<ex>(%s)")
+        self.assertEqual(
+            registry.param("const numeric *").from_lean, "to_cppClass<numeric>(%s)"
+        )
+        self.assertEqual(registry.ret("lst").lean, "Lst")
+        self.assertEqual(registry.ret("const lst &").to_lean, "make_cppClass<lst>(%s)")
+
+        # mutable references and pointers can't be shared with Lean
+        self.assertIsNone(registry.param("lst &"))
+        self.assertIsNone(registry.param("numeric *"))
+        self.assertIsNone(registry.param("std::string &"))
+        self.assertIsNone(registry.ret("symbol *"))
+        # but results are copied out of them
+        self.assertEqual(registry.ret("ex &").to_lean, "make_cppClass<ex>(%s)")
+        self.assertEqual(registry.ret("std::string &").lean, "String")
+
+    def test_memoized(self):
+        registry = self.registry
+        mapping = registry.param("const GiNaC::ex &")
+        self.assertIs(registry.param("const GiNaC::ex &"), mapping)
+        self.assertIn("const GiNaC::ex &", registry.param_cache)
+
+        # plugging in a mapping invalidates memoized lookups
+        registry.add(
+            "exmap",
+            {FORM_CONST_REF: {"lean": "@&ExMap", "from_lean": "to_exmap(%s)"}},
+            {},
+        )
+        self.assertEqual(registry.param("const exmap &").from_lean, "to_exmap(%s)")
+        self.assertEqual(registry.param("const GiNaC::ex &"), mapping)
+
+    def test_unknown_summary(self):
+        registry = self.registry
+        for line in range(3):
+            registry.param("exmap &", f"symbol.h:{line}:1")
+        registry.param("exmap &", record=False)
+        registry.ret("GiNaC::registered_class_info &")
+
+        output = io.StringIO()
+        registry.print_summary(file=output)
+        self.assertEqual(
+            output.getvalue().splitlines(),
+            [
+                "WARN Unknown parameter type exmap & used 3 times, e.g. at symbol.h:0:1",
+                "WARN Unknown return type GiNaC::registered_class_info & used 1 times",
+            ],
+        )
+
+        registry.clear_unknown()
+        output = io.StringIO()
+        registry.print_summary(file=output)
+        self.assertEqual(output.getvalue(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+import itertools
+import json
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import ijson
+from clang.cindex import CursorKind, TypeKind
+from utils.interface import (
+    ClassInterface,
+    ClassType,
+    Method,
+    MethodParam,
+    ParamType,
+    ReturnType,
+)
+from utils.types import (
+    MAP_PRIMITIVE_SPELLING_TO_TYPE_KIND,
+    cursor_kind_spelling,
+    from_lean_function,
+    is_primitive_type,
+    maps_return_type,
+    to_lean_function,
+    to_lean_method_name,
+    to_lean_param_name,
+    to_lean_return_type_name,
+    to_lean_type_name,
+    to_method_param,
+)
+
+# Reads the output of `clang -Xclang -ast-dump=json` incrementally with ijson, so a dump of
+# a GiNaC header (hundreds of MB, mostly included libstdc++) is never loaded into memory as a whole.
+# Only the entities declared directly in `NAMESPACES` of the dumped header are materialized,
+# filtered the same way as `scripts/dump.jq` did.
+
+# Here we assume all meaningful entities are in namespace GiNaC or cln
+NAMESPACES: Set[str] = {"GiNaC", "cln"}
+
+# Top-level entities of a namespace that are kept
+ENTITY_KINDS: Set[str] = {
+    "TypedefDecl",
+    "CXXRecordDecl",
+    "FunctionTemplateDecl",
+    "CXXConstructorDecl",
+    "CXXMethodDecl",
+    "FunctionDecl",
+}
+
+# Nested entities that are dropped, e.g. function bodies
+REMOVED_KINDS: Set[str] = {
+    "DeclStmt",
+    "IfStmt",
+    "NullStmt",
+    "CompoundStmt",
+    "CXXCtorInitializer",
+}
+
+# Fields of `loc.spellingLoc` that are not meaningful once the entity is out of its dump
+REMOVED_SPELLING_LOC_FIELDS: Tuple[str, ...] = (
+    "offset",
+    "line",
+    "col",
+    "tokLen",
+    "file",
+)
+
+# ijson prefixes of the namespaces and of the entities in them
+NAMESPACE_PREFIX = "inner.item"
+ENTITY_PREFIX = "inner.item.inner.item"
+
+
+def is_included(entity: Dict[str, Any]) -> bool:
+    # We will only process what's defined in the current header, not included headers
+    return "includedFrom" in (entity.get("loc") or {})
+
+
+def is_kept(entity: Dict[str, Any]) -> bool:
+    kind = entity.get("kind")
+    if kind == "CXXRecordDecl":
+        return entity.get("tagUsed") in ["struct", "class"] and "inner" in entity
+    return kind in ENTITY_KINDS
+
+
+def relative_include(file_name: str) -> str:
+    # convert the absolute include path to a relative one
+    return file_name.split("/include/")[-1]
+
+
+def shorten_loc(loc: Dict[str, Any]) -> None:
+    loc.pop("expansionLoc", None)
+    # Only locations in macro expansions have a `spellingLoc`, the update of
+    # `spellingLoc.includedFrom` adds a null one to the others
+    spelling_loc = loc.setdefault("spellingLoc", None)
+    if spelling_loc is None:
+        return
+    included_from = spelling_loc.get("includedFrom")
+    if isinstance(included_from, dict) and "file" in included_from:
+        spelling_loc["includedFrom"] = relative_include(included_from["file"])
+    # `|` binds looser than `,` in `del(..|.loc?|.spellingLoc?|.offset?, .line?, ...)`,
+    # so these are only removed from `spellingLoc`, `loc` keeps its own
+    for field in REMOVED_SPELLING_LOC_FIELDS:
+        spelling_loc.pop(field, None)
+
+
+def is_removed(value: Any) -> bool:
+    return isinstance(value, dict) and value.get("kind") in REMOVED_KINDS
+
+
+def shorten(value: Any) -> Any:
+    # The `del`s of `scripts/dump.jq` on an entity, each applied at any depth like jq's `..`
+    if isinstance(value, list):
+        return [shorten(item) for item in value if not is_removed(item)]
+    if not isinstance(value, dict):
+        return value
+
+    value.pop("id", None)
+    value.pop("range", None)
+    if "loc" in value:
+        if value["loc"] is None:
+            # it seems that "loc: null" is everywhere, so remove it
+            del value["loc"]
+        elif isinstance(value["loc"], dict):
+            shorten_loc(value["loc"])
+    if value.get("kind") == "ParmVarDecl":
+        # `del(..|select(.kind?=="ParmVarDecl")|.[]?|.inner?)` removes the `inner` of the fields
+        # of parameters, e.g. of their `type`, not the `inner` of parameters themselves
+        for field in value.values():
+            if isinstance(field, dict):
+                field.pop("inner", None)
+
+    for key in [key for key, field in value.items() if is_removed(field)]:
+        del value[key]
+    for key, field in value.items():
+        if key != "loc":
+            value[key] = shorten(field)
+    return value
+
+
+def iter_entities(file_name: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    # Yield the shortened entities of a dump, either a raw dump of clang or an already shortened one
+    with open(file_name, "rb") as file:
+        events = ijson.parse(file)
+        first_event = next(events, None)
+        if first_event is None:
+            return
+
+        # An already shortened dump is just an array of entities
+        if first_event[1] == "start_array":
+            yield from ijson.items(itertools.chain([first_event], events), "item")
+            return
+
+        namespace_kind = None
+        namespace_name = None
+        for prefix, event, value in events:
+            if prefix == NAMESPACE_PREFIX and event == "start_map":
+                namespace_kind = None
+                namespace_name = None
+            elif prefix == f"{NAMESPACE_PREFIX}.kind":
+                namespace_kind = value
+            elif prefix == f"{NAMESPACE_PREFIX}.name":
+                namespace_name = value
+            elif prefix == ENTITY_PREFIX and event == "start_map":
+                # `kind` and `name` come before `inner` in the output of clang
+                if (
+                    namespace_kind != "NamespaceDecl"
+                    or namespace_name not in NAMESPACES
+                ):
+                    continue
+                entity = build_object(events)
+                if is_included(entity) or not is_kept(entity):
+                    continue
+                yield shorten(entity)
+
+
+def build_object(events: Iterator[Tuple[str, str, Any]]) -> Dict[str, Any]:
+    # Build the object whose `start_map` was just consumed, up to its matching `end_map`
+    builder = ijson.ObjectBuilder()
+    builder.event("start_map", None)
+    depth = 1
+    for _prefix, event, value in events:
+        if event in ["start_map", "start_array"]:
+            depth += 1
+        elif event in ["end_map", "end_array"]:
+            depth -= 1
+        builder.event(event, value)
+        if depth == 0:
+            break
+    return builder.value
+
+
+def write_entities(file_name: Union[str, Path], out: IO[str]) -> int:
+    count = 0
+    out.write("[")
+    for entity in iter_entities(file_name):
+        out.write(",\n" if count > 0 else "\n")
+        out.write(json.dumps(entity, indent=2, ensure_ascii=False, default=float))
+        count += 1
+    out.write("\n]\n")
+    return count
+
+
+def shorten_dump(
+    file_name: Union[str, Path], output: Union[str, Path, None] = None
+) -> int:
+    # Replacement of `jaq -f scripts/dump.jq`, writes entities one by one, returns how many.
+    # The entities are the same as jaq's, their keys are in the order of clang's dump.
+    if output is None:
+        return write_entities(file_name, sys.stdout)
+    with open(output, "w", encoding="utf-8") as out:
+        return write_entities(file_name, out)
+
+
+# Minimal stand-ins of `clang.cindex` objects, so the type mapping in utils.types can be reused
+@dataclass
+class JsonFile:
+    name: str
+
+
+@dataclass
+class JsonLocation:
+    file: JsonFile
+    line: int
+    column: int
+
+
+@dataclass
+class JsonType:
+    spelling: str
+    kind: TypeKind
+
+    @staticmethod
+    def from_spelling(spelling: str, default_kind: TypeKind = TypeKind.UNEXPOSED):
+        return JsonType(
+            spelling, MAP_PRIMITIVE_SPELLING_TO_TYPE_KIND.get(spelling, default_kind)
+        )
+
+    def is_pod(self) -> bool:
+        return is_primitive_type(self.kind)
+
+
+@dataclass
+class JsonCursor:
+    kind: CursorKind
+    spelling: str
+    type: JsonType
+    location: JsonLocation
+
+
+MAP_JSON_KIND_TO_CURSOR_KIND: Dict[str, CursorKind] = {
+    "CXXConstructorDecl": CursorKind.CONSTRUCTOR,
+    "CXXMethodDecl": CursorKind.CXX_METHOD,
+}
+
+
+def split_function_type(qual_type: str) -> Tuple[str, str]:
+    # "const char *(int) const" => ("const char *", "(int) const")
+    depth = 0
+    for i, char in enumerate(qual_type):
+        if char == "<":
+            depth += 1
+        elif char == ">":
+            depth -= 1
+        elif char == "(" and depth == 0:
+            return qual_type[:i].rstrip(), qual_type[i:]
+    return qual_type, ""
+
+
+def is_const_function_type(qual_type: str) -> bool:
+    # "int () const" or "void () const noexcept(false)", but not "const char *()"
+    params_and_qualifiers = split_function_type(qual_type)[1]
+    depth = 0
+    for i, char in enumerate(params_and_qualifiers):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                return "const" in params_and_qualifiers[i + 1 :].split()
+    return False
+
+
+class AstJsonCollector:
+    # Collects the same interfaces as `EntityCollector.collect`, but from a JSON dump without libclang parsing
+    data: Dict[str, ClassInterface]
+
+    def __init__(self):
+        self.data = {}
+
+    def find_or_create_type(self, type_name_cpp: str) -> ClassType:
+        # Caution! It's registered in its lean name
+        type_name_lean = to_lean_type_name(
+            type_name_cpp, JsonType(type_name_cpp, TypeKind.RECORD)
+        )
+        if type_name_lean not in self.data:
+            self.data[type_name_lean] = ClassInterface(
+                type_name_cpp, [], ClassType(type_name_lean, type_name_cpp, [])
+            )
+        return self.data[type_name_lean].type
+
+    def collect_method(
+        self, entity: Dict[str, Any], class_name: str, location: JsonLocation
+    ) -> Method:
+        kind = MAP_JSON_KIND_TO_CURSOR_KIND[entity["kind"]]
+        cursor = JsonCursor(
+            kind,
+            entity["name"],
+            JsonType(entity["type"]["qualType"], TypeKind.FUNCTIONPROTO),
+            location,
+        )
+
+        if kind == CursorKind.CONSTRUCTOR:
+            result_type = JsonType(class_name, TypeKind.RECORD)
+        else:
+            result_type = JsonType.from_spelling(
+                split_function_type(entity["type"]["qualType"])[0]
+            )
+
+        params = []
+        for param in entity.get("inner", []):
+            if param.get("kind") != "ParmVarDecl":
+                continue
+            arg = JsonCursor(
+                CursorKind.PARM_DECL,
+                param.get("name", ""),
+                JsonType.from_spelling(param["type"]["qualType"]),
+                location,
+            )
+            params.append(to_method_param(arg))
+
+        kind_spelling = cursor_kind_spelling(kind)
+        is_const = is_const_function_type(entity["type"]["qualType"])
+        is_static = entity.get("storageClass") == "static"
+        return Method(
+            kind=kind_spelling,
+            cpp=cursor.spelling,
+            lean=to_lean_method_name(cursor.spelling, cursor),
+            params=params,
+            is_const=is_const,
+            is_static=is_static,
+            own=Method.is_mutating(
+                kind_spelling,
+                is_const,
+                is_static,
+                maps_return_type(result_type.spelling),
+            ),
+            return_type=ReturnType.interned(
+                cpp=result_type.spelling,
+                lean=to_lean_return_type_name(result_type.spelling, result_type),
+                to_lean=to_lean_function(result_type.spelling, result_type),
+            ),
+        )
+
+    def collect_class(self, file_name: str, entity: Dict[str, Any]) -> None:
+        class_name = entity["name"]
+        access = "private" if entity.get("tagUsed") == "class" else "public"
+        line = (entity.get("loc") or {}).get("line", 0)
+        for member in entity.get("inner", []):
+            kind = member.get("kind")
+            loc = member.get("loc") or {}
+            # clang omits the line when it's the same as the previous location
+            line = loc.get("line", line)
+            if kind == "AccessSpecDecl":
+                access = member["access"]
+                continue
+            if kind not in MAP_JSON_KIND_TO_CURSOR_KIND or member.get("isImplicit"):
+                continue
+            if access != "public":
+                continue
+            location = JsonLocation(JsonFile(file_name), line, loc.get("col", 0))
+            class_type = self.find_or_create_type(class_name)
+            method = self.collect_method(member, class_name, location)
+            if method not in class_type.methods:
+                class_type.methods.append(method)
+
+    def collect(
+        self, file_name: Union[str, Path], class_names: Optional[Set[str]] = None
+    ) -> Dict[str, ClassInterface]:
+        # Collect public constructors and methods of `class_names` (or all classes) into `data`
+        for entity in iter_entities(file_name):
+            if entity.get("kind") != "CXXRecordDecl" or "inner" not in entity:
+                continue
+            if class_names is not None and entity["name"] not in class_names:
+                continue
+            self.collect_class(str(file_name), entity)
+        return self.data
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) not in [2, 3]:
+        print(f"Usage: {argv[0]} <ast.json> [<short.json>]", file=sys.stderr)
+        return 1
+    shorten_dump(argv[1], argv[2] if len(argv) == 3 else None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import resource
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from utils.ast_json import AstJsonCollector, iter_entities
+from utils.clang import get_cpp_include_paths
+from utils.collector import EntityCollector
+from utils.paths import dir_build, dir_codegen_build, dir_root
+from utils.render import Renderer
+from utils.serialize import dump_interface
+from utils.visitor import METHOD_CURSOR_KINDS, CursorFilter
+
+T = TypeVar("T")
+
+dir_fixture: Path = dir_root / "codegen" / "tests" / "fixtures"
+
+# Shortened JSON dumps of GiNaC/CLN headers, so most stages run without clang or GiNaC
+FIXTURE_DUMPS: List[str] = [
+    "ginac-basic-h-short.json",
+    "ginac-symbol-h-short.json",
+    "cln-real-h-short.json",
+]
+
+# Parsed with libclang only when GiNaC has been built locally
+GINAC_HEADER: Path = dir_build / "ginac-1.8.7" / "ginac" / "symbol.h"
+
+# Benchmarks are slow and machine dependent, so the test only runs when this is set
+BENCHMARK_ENV = "GINAC_LEAN_BENCHMARK"
+
+RESULTS_FILE: Path = dir_codegen_build / "benchmark.json"
+# Timings depend on the machine, so the baseline is local too, written with `--update-baseline`
+BASELINE_FILE: Path = dir_codegen_build / "benchmark-baseline.json"
+
+# A stage regresses when it's slower than the baseline by both this ratio and this many seconds,
+# the latter keeps the noise of very short stages out
+TOLERANCE_RATIO = 0.5
+TOLERANCE_SECONDS = 0.05
+TOLERANCE_RSS_RATIO = 0.25
+
+
+def peak_rss_kb() -> int:
+    # `ru_maxrss` is in kilobytes on Linux, but in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+@dataclass
+class StageResult:
+    seconds: float
+    repeat: int
+    peak_rss_kb: int
+
+
+# Times each stage of codegen separately, keeping the best of `repeat` runs
+class Benchmark:
+    repeat: int
+    stages: Dict[str, StageResult]
+
+    def __init__(self, repeat: int = 3):
+        self.repeat = repeat
+        self.stages = {}
+
+    def run(self, name: str, func: Callable[[], T], repeat: Optional[int] = None) -> T:
+        repeat = self.repeat if repeat is None else repeat
+        start = time.perf_counter()
+        result = func()
+        best = time.perf_counter() - start
+        for _ in range(repeat - 1):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+        self.stages[name] = StageResult(best, repeat, peak_rss_kb())
+        print(f"INFO {name}: {best * 1000:.1f} ms")
+        return result
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        # For stages that can only run once, e.g. a cold parse
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        self.stages[name] = StageResult(elapsed, 1, peak_rss_kb())
+        print(f"INFO {name}: {elapsed * 1000:.1f} ms")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "peak_rss_kb": peak_rss_kb(),
+            "stages": {name: asdict(stage) for name, stage in self.stages.items()},
+        }
+
+    def save(self, path: Path = RESULTS_FILE) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+
+
+def find_regressions(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    ratio: float = TOLERANCE_RATIO,
+    seconds: float = TOLERANCE_SECONDS,
+    rss_ratio: float = TOLERANCE_RSS_RATIO,
+) -> List[str]:
+    # Stages missing on either side are not compared, e.g. parsing when GiNaC is not built
+    regressions = []
+    for name, stage in results["stages"].items():
+        base = baseline["stages"].get(name)
+        if base is None:
+            continue
+        limit = max(base["seconds"] * (1 + ratio), base["seconds"] + seconds)
+        if stage["seconds"] > limit:
+            regressions.append(
+                f"{name} took {stage['seconds']:.3f}s, baseline {base['seconds']:.3f}s"
+            )
+    if results["peak_rss_kb"] > baseline["peak_rss_kb"] * (1 + rss_ratio):
+        regressions.append(
+            f"peak RSS {results['peak_rss_kb']} KB, baseline {baseline['peak_rss_kb']} KB"
+        )
+    return regressions
+
+
+def run_fixture_stages(benchmark: Benchmark, renderer: Renderer) -> None:
+    dumps = [dir_fixture / dump for dump in FIXTURE_DUMPS]
+
+    entities = benchmark.run(
+        "read_ast_json",
+        lambda: {dump: list(iter_entities(dump)) for dump in dumps},
+    )
+
+    def map_types() -> AstJsonCollector:
+        collector = AstJsonCollector()
+        for dump, dump_entities in entities.items():
+            for entity in dump_entities:
+                if entity.get("kind") == "CXXRecordDecl" and "inner" in entity:
+                    collector.collect_class(str(dump), entity)
+        return collector
+
+    collector = benchmark.run("type_mapping", map_types)
+
+    interfaces = benchmark.run(
+        "to_dict",
+        lambda: {name: data.to_dict() for name, data in collector.data.items()},
+    )
+    benchmark.run(
+        "yaml_dump", lambda: [dump_interface(data) for data in interfaces.values()]
+    )
+    benchmark.run("render", lambda: renderer.render_all(interfaces))
+
+
+def run_libclang_stages(benchmark: Benchmark, header: Path) -> None:
+    benchmark.run(
+        "include_paths_probe",
+        lambda: get_cpp_include_paths(cache_file=None, refresh=True),
+        repeat=1,
+    )
+    benchmark.run("include_paths_cached", get_cpp_include_paths)
+
+    if not header.exists():
+        print(f"INFO Skipping parse and walk, {header} not found")
+        return
+
+    collector = EntityCollector(recursive=True, cache_dir=None)
+    ast = benchmark.run(
+        "parse", lambda: collector.session.index.parse(header, collector.index_args)
+    )
+
+    def walk(cursor_filter: Optional[CursorFilter] = None) -> int:
+        # a fresh collector every time, as visited headers are skipped by later walks
+        walker = EntityCollector(recursive=True, session=collector.session)
+        return sum(1 for _ in walker.walk(ast, cursor_filter))
+
+    benchmark.run("walk", walk)
+    benchmark.run(
+        "walk_pruned",
+        lambda: walk(
+            CursorFilter(METHOD_CURSOR_KINDS, namespaces=frozenset({"GiNaC"}))
+        ),
+    )
+    benchmark.run("collect", lambda: collector.collect(ast), repeat=1)
+
+
+def run_benchmarks(
+    repeat: int = 3, header: Path = GINAC_HEADER, renderer: Optional[Renderer] = None
+) -> Benchmark:
+    benchmark = Benchmark(repeat)
+    with benchmark.stage("renderer_init"):
+        renderer = renderer or Renderer()
+    run_fixture_stages(benchmark, renderer)
+    if shutil.which("clang") is not None:
+        run_libclang_stages(benchmark, header)
+    else:
+        print("INFO Skipping libclang stages, clang not found")
+    return benchmark
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the stages of codegen")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=RESULTS_FILE)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store the results as the new baseline instead of comparing with it",
+    )
+    args = parser.parse_args(argv)
+
+    benchmark = run_benchmarks(args.repeat)
+    benchmark.save(args.output)
+    print(f"INFO Results written to {args.output}")
+
+    if args.update_baseline or not args.baseline.exists():
+        benchmark.save(args.baseline)
+        print(f"INFO Baseline written to {args.baseline}")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    regressions = find_regressions(benchmark.to_dict(), baseline)
+    for regression in regressions:
+        print(f"WARN Regression: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
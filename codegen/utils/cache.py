@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Union
+
+from clang.cindex import (
+    Index,
+    TranslationUnit,
+    TranslationUnitLoadError,
+    TranslationUnitSaveError,
+)
+from utils.clang import ErrorLocation, error_locations
+
+# Bump this when the layout of the cache changes
+CACHE_VERSION = 2
+
+
+def file_digest(file_name: Union[str, Path]) -> str:
+    return hashlib.sha256(Path(file_name).read_bytes()).hexdigest()
+
+
+def write_text_atomic(path: Path, text: str) -> None:
+    # A crash while writing leaves either the previous content or the new one, never a part of it
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+# Caches parsed translation units on disk with `TranslationUnit.save`, and reloads them with `Index.read`.
+# An entry is keyed by the header path and `index_args`, and is only reused if the content of the header
+# and all its transitive includes is unchanged. Contents are only re-hashed when mtime or size changed,
+# and the manifest then records the new mtime so that they are not re-hashed again on the next load.
+class TranslationUnitCache:
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+
+    def key(self, file: Union[str, Path], args: List[str]) -> str:
+        key_source = json.dumps(
+            [CACHE_VERSION, os.path.abspath(file), list(args)], ensure_ascii=False
+        )
+        return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+    def ast_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.ast"
+
+    def manifest_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def is_dependency_unchanged(self, dep: Dict[str, Any]) -> bool:
+        # Updates the mtime of `dep` when only the mtime changed
+        try:
+            stat = os.stat(dep["file"])
+        except OSError:
+            return False
+
+        if stat.st_mtime_ns == dep["mtime_ns"] and stat.st_size == dep["size"]:
+            return True
+
+        if file_digest(dep["file"]) != dep["sha256"]:
+            return False
+        dep["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    def write_manifest(self, key: str, manifest: Dict[str, Any]) -> None:
+        write_text_atomic(self.manifest_path(key), json.dumps(manifest, indent=2))
+
+    def read_manifest(
+        self, file: Union[str, Path], args: List[str]
+    ) -> Optional[Dict[str, Any]]:
+        manifest_path = self.manifest_path(self.key(file, args))
+        if not manifest_path.exists():
+            return None
+
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except ValueError:
+            return None
+
+        if manifest.get("version") != CACHE_VERSION or manifest.get("args") != list(
+            args
+        ):
+            return None
+
+        return manifest
+
+    def is_valid(self, file: Union[str, Path], args: List[str]) -> bool:
+        key = self.key(file, args)
+        manifest = self.read_manifest(file, args)
+
+        if manifest is None or not self.ast_path(key).exists():
+            return False
+
+        mtimes = [dep["mtime_ns"] for dep in manifest["deps"]]
+        for dep in manifest["deps"]:
+            if not self.is_dependency_unchanged(dep):
+                return False
+
+        if mtimes != [dep["mtime_ns"] for dep in manifest["deps"]]:
+            self.write_manifest(key, manifest)
+        return True
+
+    def load(
+        self, index: Index, file: Union[str, Path], args: List[str]
+    ) -> Optional[TranslationUnit]:
+        ast_path = self.ast_path(self.key(file, args))
+
+        if not self.is_valid(file, args):
+            return None
+
+        try:
+            return index.read(str(ast_path))
+        except TranslationUnitLoadError:
+            return None
+
+    def load_error_locations(
+        self, file: Union[str, Path], args: List[str]
+    ) -> Set[ErrorLocation]:
+        # Diagnostics are not kept in AST files, so the error locations are kept in the manifest
+        manifest = self.read_manifest(file, args)
+        if manifest is None:
+            return set()
+        return {(error[0], error[1]) for error in manifest["errors"]}
+
+    def save(
+        self, ast: TranslationUnit, file: Union[str, Path], args: List[str]
+    ) -> None:
+        key = self.key(file, args)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        dep_files = [str(file)]
+        for include in ast.get_includes():
+            included_filename: str = include.include.name
+            if included_filename not in dep_files:
+                dep_files.append(included_filename)
+
+        deps = []
+        for dep_file in dep_files:
+            stat = os.stat(dep_file)
+            deps.append(
+                {
+                    "file": dep_file,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "sha256": file_digest(dep_file),
+                }
+            )
+
+        # Invalidate the entry first so that the manifest never describes another AST
+        self.manifest_path(key).unlink(missing_ok=True)
+        ast_path = self.ast_path(key)
+        tmp_ast_path = ast_path.with_name(f"{ast_path.name}.{os.getpid()}.tmp")
+        try:
+            ast.save(str(tmp_ast_path))
+        except TranslationUnitSaveError as error:
+            tmp_ast_path.unlink(missing_ok=True)
+            print(f"WARN Failed to cache the AST of {file}: {error}", file=sys.stderr)
+            return
+        os.replace(tmp_ast_path, ast_path)
+
+        self.write_manifest(
+            key,
+            {
+                "version": CACHE_VERSION,
+                "args": list(args),
+                "deps": deps,
+                "errors": sorted(error_locations(ast)),
+            },
+        )
@@ -1,11 +1,39 @@
+import json
+import os
+import shutil
 import subprocess  # nosec
 import sys
+from ctypes import c_uint
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+from clang.cindex import Diagnostic, SourceLocation, TranslationUnit, conf
+from utils.paths import dir_codegen_build
 
-def get_cpp_include_paths():
+# Set to refresh the cached include paths, e.g. after switching clang installations.
+# They are then probed again once per process, not on every call.
+REFRESH_CLANG_PATHS_ENV: str = "GINAC_LEAN_REFRESH_CLANG_PATHS"
+CLANG_PATHS_CACHE_FILE: Path = dir_codegen_build / "clang-paths.json"
+
+# In-process memo, keyed by (clang path, mtime)
+_cpp_include_paths: Dict[Tuple[str, int], List[str]] = {}
+
+
+def probe_clang_version(clang: str = "clang") -> str:
+    # First line of `clang --version`, much cheaper than probing the include paths
+    result = subprocess.run(
+        [clang, "--version"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+    )  # nosec
+    return result.stdout.decode(sys.getdefaultencoding()).split("\n")[0].strip()
+
+
+def probe_cpp_include_paths(clang: str = "clang") -> List[str]:
     # run `clang -v -E -x c++ - -v < /dev/null 2>&1` to get the include paths   # nosec
     result = subprocess.run(
-        ["clang", "-v", "-E", "-x", "c++", "-", "-v"],
+        [clang, "-v", "-E", "-x", "c++", "-", "-v"],
         input=b"",
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
@@ -22,3 +50,73 @@ def get_cpp_include_paths():
             include_paths.append(line)
 
     return include_paths
+
+
+def read_clang_paths_cache(cache_file: Path) -> Dict[str, Any]:
+    try:
+        return json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def get_cpp_include_paths(
+    clang: str = "clang",
+    cache_file: Optional[Path] = CLANG_PATHS_CACHE_FILE,
+    refresh: bool = False,
+) -> List[str]:
+    # Probing runs clang in a subprocess, so the result is cached in memory, and in `cache_file`
+    # keyed by the resolved clang binary, its mtime and its version string.
+    # Only `clang --version` runs on a hit in `cache_file`, once per process.
+    clang_path = shutil.which(clang)
+    if clang_path is None:
+        raise FileNotFoundError(f"{clang} not found")
+    clang_path = os.path.realpath(clang_path)
+    key = (clang_path, os.stat(clang_path).st_mtime_ns)
+
+    if not refresh and key in _cpp_include_paths:
+        return _cpp_include_paths[key]
+
+    refresh = refresh or REFRESH_CLANG_PATHS_ENV in os.environ
+    version = probe_clang_version(clang_path)
+    cache = read_clang_paths_cache(cache_file) if cache_file is not None else {}
+    entry = cache.get(clang_path)
+    if (
+        not refresh
+        and entry is not None
+        and entry["mtime_ns"] == key[1]
+        and entry["version"] == version
+    ):
+        include_paths = entry["include_paths"]
+    else:
+        include_paths = probe_cpp_include_paths(clang_path)
+        if cache_file is not None:
+            cache[clang_path] = {
+                "mtime_ns": key[1],
+                "version": version,
+                "include_paths": include_paths,
+            }
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            cache_file.write_text(json.dumps(cache, indent=2), encoding="utf-8")
+
+    _cpp_include_paths[key] = include_paths
+    return include_paths
+
+
+def is_in_system_header(location: SourceLocation) -> bool:
+    # `clang_Location_isInSystemHeader` is not exposed by the libclang 16 Python binding
+    func = conf.lib.clang_Location_isInSystemHeader  # pylint: disable=no-member
+    func.argtypes = [SourceLocation]
+    func.restype = c_uint
+    return bool(func(location))
+
+
+# (file, line) of an error diagnostic
+ErrorLocation = Tuple[str, int]
+
+
+def error_locations(ast: TranslationUnit) -> Set[ErrorLocation]:
+    return {
+        (diagnostic.location.file.name, diagnostic.location.line)
+        for diagnostic in ast.diagnostics
+        if diagnostic.severity >= Diagnostic.Error and diagnostic.location.file
+    }
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.paths import dir_codegen_build, dir_root
+
+# Only the standard library and utils.paths are imported here, every command imports what it needs,
+# so that e.g. `render` never loads libclang nor runs clang to probe include paths
+
+DEFAULT_NAMESPACE = "Ginac"
+# C++ namespaces collected from, the rest of the headers is pruned while walking
+DEFAULT_CPP_NAMESPACES: List[str] = ["GiNaC"]
+DEFAULT_OUT_DIRS: Dict[str, Path] = {"cpp": dir_root / "cpp", "lean": dir_root / "lean"}
+
+
+def default_interfaces_file() -> Path:
+    # Written by `parse` and read by `render`, in the fastest binary format available
+    from utils.serialize import (  # pylint: disable=import-outside-toplevel
+        FORMAT_BINARY,
+        SUFFIXES_BY_FORMAT,
+    )
+
+    return dir_codegen_build / f"interfaces{SUFFIXES_BY_FORMAT[FORMAT_BINARY]}"
+
+
+def batch_method(spec: str) -> Tuple[str, str]:
+    # `symbol::get_name`, the C++ names of a class and of its methods to batch
+    class_name, sep, method_name = spec.rpartition("::")
+    if not sep or not class_name or not method_name:
+        raise argparse.ArgumentTypeError(f"expected CLASS::METHOD, got {spec!r}")
+    return class_name, method_name
+
+
+def command_parse(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from utils.collector import EntityCollector, ParseSession
+    from utils.serialize import save_interfaces
+
+    session = ParseSession(
+        args.cache_dir,
+        include_dirs=args.include_dir,
+        instrument=args.instrument or None,
+    )
+    collector = EntityCollector(
+        recursive=True,
+        session=session,
+        namespaces=args.cpp_namespaces or DEFAULT_CPP_NAMESPACES,
+    )
+    class_names = set(args.class_names) if args.class_names else None
+    if args.jobs > 1 and len(args.headers) > 1:
+        from utils.parallel import collect_headers_in_parallel
+
+        collect_headers_in_parallel(collector, args.headers, class_names, args.jobs)
+    else:
+        for header in args.headers:
+            collector.collect(collector.parse(header), class_names)
+    collector.arg_report.print()
+
+    batch: Dict[str, Set[str]] = {}
+    for class_name, method_name in args.batch:
+        batch.setdefault(class_name, set()).add(method_name)
+    for class_interface in collector.data.values():
+        class_interface.namespace = args.namespace
+        class_interface.type.enable_batch(batch.pop(class_interface.type.cpp, set()))
+    for class_name in batch:
+        print(
+            f"WARN Can't batch methods of {class_name}, not collected", file=sys.stderr
+        )
+    output = args.output or default_interfaces_file()
+    count = save_interfaces(collector.data.values(), output)
+    print(f"INFO {count} classes written to {output}")
+    session.instrumentation.save()
+    return 0
+
+
+def command_render(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from utils.generate import GenerationManifest, generate
+    from utils.serialize import load_interfaces
+
+    input_file = args.input or default_interfaces_file()
+    if not input_file.exists():
+        print(
+            f"WARN {input_file} not found, run the parse command first", file=sys.stderr
+        )
+        return 1
+    interfaces = {
+        class_interface.type.lean: class_interface
+        for class_interface in load_interfaces(input_file)
+    }
+    kinds = args.kinds or list(DEFAULT_OUT_DIRS)
+    out_dirs = {kind: DEFAULT_OUT_DIRS[kind] for kind in kinds}
+    if args.out_dir is not None:
+        out_dirs = {kind: args.out_dir / kind for kind in kinds}
+    manifest = (
+        GenerationManifest(args.manifest)
+        if args.manifest is not None
+        else GenerationManifest()
+    )
+    written = generate(interfaces, out_dirs, manifest)
+    for path in written:
+        print(f"INFO Written {path}")
+    print(f"INFO {len(written)} files written for {len(interfaces)} classes")
+    return 0
+
+
+def command_serve(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    import threading
+
+    from utils.collector import ParseSession
+    from utils.server import CodegenServer, serve_socket, serve_stream
+
+    session = ParseSession(
+        args.cache_dir,
+        include_dirs=args.include_dir,
+        instrument=args.instrument or None,
+    )
+    server = CodegenServer(
+        args.headers,
+        dict(DEFAULT_OUT_DIRS),
+        class_names=set(args.class_names) if args.class_names else None,
+        namespace=args.namespace,
+        cpp_namespaces=args.cpp_namespaces or DEFAULT_CPP_NAMESPACES,
+        session=session,
+    )
+    stop = threading.Event()
+    if args.watch is not None:
+        threading.Thread(
+            target=server.watch, args=(args.watch, stop), daemon=True
+        ).start()
+    try:
+        if args.socket is not None:
+            serve_socket(server, args.socket)
+        else:
+            serve_stream(server, sys.stdin, sys.stdout)
+    finally:
+        stop.set()
+        session.instrumentation.save()
+    return 0
+
+
+def command_index(args: argparse.Namespace) -> int:
+    # pylint: disable=import-outside-toplevel
+    from utils.collector import ParseSession
+    from utils.index import INDEX_FILE, SymbolIndex
+
+    session = ParseSession(args.cache_dir, include_dirs=args.include_dir)
+    with SymbolIndex(args.db or INDEX_FILE) as index:
+        count = index.add(
+            args.version,
+            args.headers,
+            session,
+            namespaces=args.cpp_namespaces or DEFAULT_CPP_NAMESPACES,
+        )
+        print(f"INFO {count} declarations of {args.version} indexed in {index.path}")
+    return 0
+
+
+def command_index_diff(args: argparse.Namespace) -> int:
+    # Public declarations removed and added between two indexed versions, exits with 1 if any
+    from utils.index import (  # pylint: disable=import-outside-toplevel
+        INDEX_FILE,
+        SymbolIndex,
+    )
+
+    with SymbolIndex(args.db or INDEX_FILE) as index:
+        for version in [args.old, args.new]:
+            if version not in index.versions():
+                print(f"WARN {version} is not indexed in {index.path}", file=sys.stderr)
+                return 2
+        removed, added = index.diff(args.old, args.new)
+    for sign, declarations in [("-", removed), ("+", added)]:
+        for declaration in declarations:
+            scope = f"{declaration.class_name}::" if declaration.class_name else ""
+            print(f"{sign} {declaration.kind} {scope}{declaration.signature}")
+    return 1 if removed or added else 0
+
+
+def method_signature(method: Dict) -> str:
+    params = ", ".join(param["type"]["cpp"] for param in method["params"])
+    return f"{method['return_type']['cpp']} {method['cpp']}({params})"
+
+
+def diff_class(class_name: str, old: Dict, new: Dict) -> List[str]:
+    lines = []
+    old_methods = [method_signature(method) for method in old["type"]["methods"]]
+    new_methods = [method_signature(method) for method in new["type"]["methods"]]
+    lines += [f"- {class_name}: {m}" for m in old_methods if m not in new_methods]
+    lines += [f"+ {class_name}: {m}" for m in new_methods if m not in old_methods]
+    if not lines:
+        # same signatures, but e.g. different mappings or flags
+        lines.append(f"~ {class_name}")
+    return lines
+
+
+def command_diff(args: argparse.Namespace) -> int:
+    # Compares two interface files class by class, exits with 1 if they differ like `diff`
+    from utils.serialize import (  # pylint: disable=import-outside-toplevel
+        load_interfaces,
+    )
+
+    old = {i.type.lean: i.to_dict() for i in load_interfaces(args.old)}
+    new = {i.type.lean: i.to_dict() for i in load_interfaces(args.new)}
+    lines: List[str] = []
+    for class_name in sorted(old.keys() | new.keys()):
+        if class_name not in new:
+            lines.append(f"- {class_name}")
+        elif class_name not in old:
+            lines.append(f"+ {class_name}")
+        elif old[class_name] != new[class_name]:
+            lines += diff_class(class_name, old[class_name], new[class_name])
+    for line in lines:
+        print(line)
+    return 1 if lines else 0
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="codegen", description="Generate Lean bindings of GiNaC"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parse = commands.add_parser("parse", help="collect interfaces from C++ headers")
+    parse.add_argument("headers", nargs="+", type=Path)
+    parse.add_argument(
+        "--class", dest="class_names", action="append", help="only collect these"
+    )
+    parse.add_argument("--include-dir", action="append", type=Path, default=[])
+    parse.add_argument("--cache-dir", type=Path, default=None)
+    parse.add_argument("--namespace", default=DEFAULT_NAMESPACE)
+    parse.add_argument(
+        "--cpp-namespace",
+        dest="cpp_namespaces",
+        action="append",
+        help=f"only collect from these, default {DEFAULT_CPP_NAMESPACES}",
+    )
+    parse.add_argument(
+        "--batch",
+        action="append",
+        type=batch_method,
+        default=[],
+        metavar="CLASS::METHOD",
+        help="also generate a variant over arrays, e.g. symbol::get_name",
+    )
+    parse.add_argument("--jobs", type=int, default=1)
+    parse.add_argument("--instrument", action="store_true")
+    parse.add_argument("--output", type=Path, default=None)
+    parse.set_defaults(run=command_parse)
+
+    render = commands.add_parser("render", help="generate bindings from interfaces")
+    render.add_argument("--input", type=Path, default=None)
+    render.add_argument(
+        "--kind", dest="kinds", action="append", choices=["cpp", "lean"], default=None
+    )
+    render.add_argument(
+        "--out-dir", type=Path, default=None, help="instead of the repo's cpp and lean"
+    )
+    render.add_argument("--manifest", type=Path, default=None)
+    render.set_defaults(run=command_render)
+
+    serve = commands.add_parser(
+        "serve",
+        help="keep headers parsed and rebuild on requests over stdin or a socket",
+    )
+    serve.add_argument("headers", nargs="+", type=Path)
+    serve.add_argument(
+        "--class", dest="class_names", action="append", help="only collect these"
+    )
+    serve.add_argument("--include-dir", action="append", type=Path, default=[])
+    serve.add_argument("--cache-dir", type=Path, default=None)
+    serve.add_argument("--namespace", default=DEFAULT_NAMESPACE)
+    serve.add_argument(
+        "--cpp-namespace",
+        dest="cpp_namespaces",
+        action="append",
+        help=f"only collect from these, default {DEFAULT_CPP_NAMESPACES}",
+    )
+    serve.add_argument("--instrument", action="store_true")
+    serve.add_argument("--socket", type=Path, default=None, help="instead of stdin")
+    serve.add_argument(
+        "--watch",
+        type=float,
+        default=None,
+        help="also poll for changes every N seconds",
+    )
+    serve.set_defaults(run=command_serve)
+
+    index = commands.add_parser(
+        "index", help="store declarations of C++ headers in a SQLite database"
+    )
+    index.add_argument("headers", nargs="+", type=Path)
+    index.add_argument(
+        "--version", default="current", help="e.g. 1.8.7, indexed again if it exists"
+    )
+    index.add_argument("--db", type=Path, default=None)
+    index.add_argument("--include-dir", action="append", type=Path, default=[])
+    index.add_argument("--cache-dir", type=Path, default=None)
+    index.add_argument(
+        "--cpp-namespace",
+        dest="cpp_namespaces",
+        action="append",
+        help=f"only index these, default {DEFAULT_CPP_NAMESPACES}",
+    )
+    index.set_defaults(run=command_index)
+
+    index_diff = commands.add_parser(
+        "index-diff", help="compare the declarations of two indexed versions"
+    )
+    index_diff.add_argument("old")
+    index_diff.add_argument("new")
+    index_diff.add_argument("--db", type=Path, default=None)
+    index_diff.set_defaults(run=command_index_diff)
+
+    diff = commands.add_parser("diff", help="compare two interface files")
+    diff.add_argument("old", type=Path)
+    diff.add_argument("new", type=Path)
+    diff.set_defaults(run=command_diff)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = create_parser().parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,30 @@
 from __future__ import annotations
 
 import os
-import re
-import sys
-from dataclasses import dataclass, field
+import threading
 from pathlib import Path
-from typing import Any, Dict, Generator, Iterator, List, Optional, Sequence, Set, Union
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Union
 
-import yaml
 from clang.cindex import (
-    AccessSpecifier,
-    Config,
     Cursor,
     CursorKind,
-    FileInclusion,
     Index,
     TranslationUnit,
+    TranslationUnitLoadError,
 )
 from clang.cindex import Type as CppType
-from clang.cindex import TypeKind, conf
-from utils.clang import get_cpp_include_paths
+from utils.cache import TranslationUnitCache, file_digest
+from utils.clang import (
+    ErrorLocation,
+    error_locations,
+    get_cpp_include_paths,
+    is_in_system_header,
+)
+from utils.instrument import (
+    Instrumentation,
+    NullInstrumentation,
+    create_instrumentation,
+)
 from utils.interface import (
     ClassInterface,
     ClassType,
@@ -28,32 +33,225 @@ from utils.interface import (
     ParamType,
     ReturnType,
 )
-from utils.types import to_lean_type_name
+from utils.pch import PrecompiledHeader
+from utils.types import (
+    ArgCheckReport,
+    check_arg_valid,
+    check_valid,
+    cursor_kind_spelling,
+    from_lean_function,
+    maps_return_type,
+    to_lean_function,
+    to_lean_method_name,
+    to_lean_param_name,
+    to_lean_return_type_name,
+    to_lean_type_name,
+    to_method_param,
+)
+from utils.visitor import (
+    CLASS_CURSOR_KINDS,
+    METHOD_CURSOR_KINDS,
+    CursorFilter,
+    walk_pruned,
+)
+
+DEFAULT_INDEX_ARGS: List[str] = ["-xc++", "-std=c++11"]
+
+
+# An Index with its args and the translation units parsed with it, which can be shared by
+# many collectors, e.g. from a thread pool or a long-running process
+class ParseSession:
+    index: Index
+    index_args: List[str]
+    cpp_include_paths: List[str]
+    tu_cache: Optional[TranslationUnitCache] = None
+    units: Dict[str, TranslationUnit]
+    errors: Dict[str, Set[ErrorLocation]]
+    instrumentation: Union[Instrumentation, NullInstrumentation]
+
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        cpp_include_paths: Optional[List[str]] = None,
+        include_dirs: Optional[List[Union[str, Path]]] = None,
+        pch: Optional[PrecompiledHeader] = None,
+        instrument: Optional[bool] = None,
+    ):
+        # Enabled by `instrument`, or by the environment when it's None, see utils.instrument
+        self.instrumentation = create_instrumentation(instrument)
+        self.index = Index.create()
+        self.cpp_include_paths = (
+            list(cpp_include_paths)
+            if cpp_include_paths is not None
+            else get_cpp_include_paths()
+        )
+        # Add C++ include paths to the index or libclang fail to recognize std::string etc.
+        self.index_args = DEFAULT_INDEX_ARGS + [
+            "-I" + include_path for include_path in self.cpp_include_paths
+        ]
+        # e.g. where GiNaC and CLN headers are installed
+        self.include_dirs = list(include_dirs or [])
+        self.index_args += [
+            "-I" + str(include_dir) for include_dir in self.include_dirs
+        ]
+        self.pch = pch
+        if pch is not None:
+            pch_path = pch.ensure(self.index, self.index_args)
+            self.index_args = self.index_args + ["-include-pch", str(pch_path)]
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            if pch is None:
+                self.tu_cache = TranslationUnitCache(cache_dir)
+            else:
+                # libclang 16 crashes reading translation units parsed with `-include-pch`,
+                # which already parse fast anyway
+                print(
+                    "INFO Translation unit cache is disabled when using a precompiled header"
+                )
+        self.units = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+        self.file_locks: Dict[str, threading.Lock] = {}
+
+    def file_lock(self, file_name: str) -> threading.Lock:
+        with self.lock:
+            return self.file_locks.setdefault(file_name, threading.Lock())
+
+    def parse(self, file: Union[str, Path]) -> TranslationUnit:
+        file_name = os.path.abspath(file)
+        # Different files are parsed concurrently, the same file only once
+        with self.file_lock(file_name):
+            if file_name not in self.units:
+                self.units[file_name] = self.load_or_parse(file)
+            else:
+                self.instrumentation.count("parse_memo_hits")
+            return self.units[file_name]
+
+    def load_or_parse(self, file: Union[str, Path]) -> TranslationUnit:
+        file_name = os.path.abspath(file)
+        instrumentation = self.instrumentation
+        if self.tu_cache is not None:
+            with instrumentation.timer("tu_cache_load", file_name):
+                ast = self.tu_cache.load(self.index, file, self.index_args)
+            if ast is not None:
+                instrumentation.count("tu_cache_hits")
+                self.errors[file_name] = self.tu_cache.load_error_locations(
+                    file, self.index_args
+                )
+                return ast
+            instrumentation.count("tu_cache_misses")
+
+        with instrumentation.timer("parse", file_name):
+            ast = self.index.parse(file, args=self.index_args)
+        instrumentation.count("parses")
+        self.errors[file_name] = error_locations(ast)
+        if self.tu_cache is not None:
+            with instrumentation.timer("tu_cache_save", file_name):
+                self.tu_cache.save(ast, file, self.index_args)
+
+        return ast
+
+    def reparse(self, file: Union[str, Path]) -> TranslationUnit:
+        # After the file or one of its includes changed, e.g. in a long-running server,
+        # reparse the unit in place with the same Index instead of starting over
+        file_name = os.path.abspath(file)
+        instrumentation = self.instrumentation
+        with self.file_lock(file_name):
+            ast = self.units.get(file_name)
+            if ast is None:
+                self.units[file_name] = self.load_or_parse(file)
+                return self.units[file_name]
+            try:
+                with instrumentation.timer("reparse", file_name):
+                    ast.reparse()
+            except TranslationUnitLoadError:
+                # e.g. a unit read from the cache, parse it anew then
+                ast = self.load_or_parse(file)
+                self.units[file_name] = ast
+                return ast
+            instrumentation.count("reparses")
+            self.errors[file_name] = error_locations(ast)
+            if self.tu_cache is not None:
+                with instrumentation.timer("tu_cache_save", file_name):
+                    self.tu_cache.save(ast, file, self.index_args)
+            return ast
+
+    def dependencies(self, file: Union[str, Path]) -> List[str]:
+        # The file and everything it includes, as last parsed
+        file_name = os.path.abspath(file)
+        ast = self.units.get(file_name)
+        if ast is None:
+            return [file_name]
+        return [file_name] + [include.include.name for include in ast.get_includes()]
+
+    def error_locations(self, ast: TranslationUnit) -> Set[ErrorLocation]:
+        file_name = os.path.abspath(ast.spelling)
+        if file_name not in self.errors:
+            self.errors[file_name] = error_locations(ast)
+        return self.errors[file_name]
 
 
 class EntityCollector:
     recursive: bool = True
-    visited_headers: Set[str] = set()
-    data: Dict[str, ClassInterface] = {}
-    cpp_include_paths: List[str] = []
-    index: Index = None
-    index_args: List[str] = ["-xc++", "-std=c++11"]
+    # Walk the one translation unit and attribute cursors to headers by location,
+    # instead of re-parsing every included header
+    single_parse: bool = True
+    visited_headers: Set[str]
+    data: Dict[str, ClassInterface]
+    # Lean type name => header declaring it
+    class_headers: Dict[str, str]
+    session: ParseSession
+    arg_report: ArgCheckReport
+    # Top-level C++ namespaces collected from, e.g. {"GiNaC"}, None for any
+    namespaces: Optional[FrozenSet[str]] = None
 
-    def __init__(self, recursive):
+    def __init__(
+        self,
+        recursive,
+        single_parse=True,
+        cache_dir: Optional[Path] = None,
+        session: Optional[ParseSession] = None,
+        instrument: Optional[bool] = None,
+        namespaces: Optional[Iterable[str]] = None,
+    ):
         self.recursive = recursive
-        self.index = Index.create()
-        # Add C++ include paths to the index or libclang fail to recognize std::string etc.
-        self.index_args.extend(
-            ["-I" + include_path for include_path in self.get_cpp_include_paths()]
+        self.single_parse = single_parse
+        self.namespaces = frozenset(namespaces) if namespaces is not None else None
+        self.visited_headers = set()
+        self.data = {}
+        self.class_headers = {}
+        # A given session comes with its own instrumentation
+        self.session = (
+            session
+            if session is not None
+            else ParseSession(cache_dir, instrument=instrument)
         )
+        self.arg_report = ArgCheckReport(self.session.error_locations)
 
-    def parse(self, file: Path) -> TranslationUnit:
-        return self.index.parse(file, args=self.index_args)
+    @property
+    def instrumentation(self) -> Union[Instrumentation, NullInstrumentation]:
+        return self.session.instrumentation
 
-    def get_cpp_include_paths(self):
-        if not self.cpp_include_paths:
-            self.cpp_include_paths = get_cpp_include_paths()
+    @property
+    def index(self) -> Index:
+        return self.session.index
+
+    @property
+    def index_args(self) -> List[str]:
+        return self.session.index_args
+
+    @property
+    def cpp_include_paths(self) -> List[str]:
+        return self.session.cpp_include_paths
 
+    @property
+    def tu_cache(self) -> Optional[TranslationUnitCache]:
+        return self.session.tu_cache
+
+    def parse(self, file: Union[str, Path]) -> TranslationUnit:
+        return self.session.parse(file)
+
+    def get_cpp_include_paths(self):
         return self.cpp_include_paths
 
     def in_cpp_include_paths(self, file_name: str) -> bool:
@@ -66,27 +264,92 @@ class EntityCollector:
     def should_skip(self, file_name: str) -> bool:
         # print(f'Checking if {file_name} should be skipped...')
 
-        return file_name in self.visited_headers or self.in_cpp_include_paths(file_name)
+        skip = file_name in self.visited_headers or self.in_cpp_include_paths(file_name)
+        if skip:
+            self.instrumentation.count("reparses_avoided")
+        return skip
 
     def visit_file(self, included_filename: str):
         # print(f'Visiting {included_filename}...')
         self.visited_headers.add(included_filename)
 
-    def walk(self, ast: TranslationUnit) -> Iterator[Cursor]:
+    def walk(
+        self, ast: TranslationUnit, cursor_filter: Optional[CursorFilter] = None
+    ) -> Iterator[Cursor]:
+        # Every cursor, or only those of `cursor_filter` without descending into pruned subtrees
+        instrumentation = self.instrumentation
+        if not instrumentation.enabled:
+            return self.walk_unit(ast, cursor_filter)
+        return instrumentation.count_cursors(
+            self.walk_unit(ast, cursor_filter), "walk", ast.spelling
+        )
+
+    def walk_unit(
+        self, ast: TranslationUnit, cursor_filter: Optional[CursorFilter] = None
+    ) -> Iterator[Cursor]:
+        if self.recursive and self.single_parse:
+            yield from self.walk_single_parse(ast, cursor_filter)
+            return
+
         if self.recursive:
             for include in ast.get_includes():
                 included_filename: str = include.include.name
                 if not self.should_skip(included_filename):
                     self.visit_file(included_filename)
-                    # FIXME: index_args referring to global variable
-                    included_ast: TranslationUnit = self.index.parse(
-                        included_filename, args=self.index_args
-                    )
-                    for inner_cursor in self.walk(included_ast):
+                    included_ast: TranslationUnit = self.parse(included_filename)
+                    for inner_cursor in self.walk_unit(included_ast, cursor_filter):
                         yield inner_cursor
 
-        for cursor in ast.cursor.walk_preorder():
-            yield cursor
+        if cursor_filter is None:
+            yield from ast.cursor.walk_preorder()
+            return
+        for top_level_cursor in ast.cursor.get_children():
+            location = top_level_cursor.location
+            if location.file is None or is_in_system_header(location):
+                continue
+            yield from walk_pruned(top_level_cursor, cursor_filter)
+
+    def walk_single_parse(
+        self, ast: TranslationUnit, cursor_filter: Optional[CursorFilter] = None
+    ) -> Iterator[Cursor]:
+        if cursor_filter is None:
+            yield ast.cursor
+        for top_level_cursor in self.top_level_cursors(ast):
+            if cursor_filter is None:
+                yield from top_level_cursor.walk_preorder()
+            else:
+                yield from walk_pruned(top_level_cursor, cursor_filter)
+
+    def top_level_cursors(self, ast: TranslationUnit) -> Iterator[Cursor]:
+        # The main file is always walked, like the top-level parse in the re-parsing mode,
+        # headers follow the same skip rules as `should_skip`/`visit_file`
+        walked_files: Set[str] = {ast.spelling}
+        skipped_files: Set[str] = set()
+
+        for top_level_cursor in ast.cursor.get_children():
+            location = top_level_cursor.location
+            location_file = location.file
+            if location_file is None:
+                # builtin declarations have no file
+                continue
+
+            file_name: str = location_file.name
+            if file_name in skipped_files:
+                continue
+            if file_name not in walked_files:
+                # libclang drops `-I` paths duplicating its own system include paths,
+                # so system headers don't always match `in_cpp_include_paths`
+                if is_in_system_header(location):
+                    self.instrumentation.count("system_headers_skipped")
+                    skipped_files.add(file_name)
+                    continue
+                if self.should_skip(file_name):
+                    skipped_files.add(file_name)
+                    continue
+                self.visit_file(file_name)
+                walked_files.add(file_name)
+
+            yield top_level_cursor
 
     def find_or_create_class_interface(
         self, type_name_cpp: str, cpp_type: CppType
@@ -101,8 +364,116 @@ class EntityCollector:
             type_name_cpp, [], ClassType(type_name_lean, type_name_cpp, [])
         )
         self.data[type_name_lean] = class_interface
+        if cpp_type is not None:
+            declaration_file = cpp_type.get_declaration().location.file
+            if declaration_file is not None:
+                self.class_headers[type_name_lean] = declaration_file.name
         return class_interface
 
+    def header_digests(self) -> Dict[str, str]:
+        # Content hashes of the headers declaring each class, as inputs of incremental codegen
+        return {
+            type_name_lean: file_digest(header)
+            for type_name_lean, header in self.class_headers.items()
+        }
+
     def find_or_create_type(self, type_name_cpp: str, cpp_type: CppType) -> ClassType:
         class_interface = self.find_or_create_class_interface(type_name_cpp, cpp_type)
         return class_interface.type
+
+    def collect_method(self, cursor: Cursor) -> Method:
+        class_type_name = cursor.lexical_parent.spelling
+        class_cursor = cursor.lexical_parent
+
+        return_type = (
+            ReturnType.interned(
+                cpp=class_type_name,
+                lean=to_lean_type_name(class_type_name, class_cursor.type),
+                to_lean=to_lean_function(class_type_name, class_cursor.type),
+            )
+            if cursor.kind == CursorKind.CONSTRUCTOR
+            else ReturnType.interned(
+                cpp=cursor.result_type.spelling,
+                lean=to_lean_return_type_name(
+                    cursor.result_type.spelling, cursor.result_type
+                ),
+                to_lean=to_lean_function(
+                    cursor.result_type.spelling, cursor.result_type
+                ),
+            )
+        )
+
+        kind = cursor_kind_spelling(cursor.kind)
+        is_const = cursor.is_const_method()
+        is_static = cursor.is_static_method()
+        method = Method(
+            kind=kind,
+            cpp=cursor.spelling,
+            lean=to_lean_method_name(cursor.spelling, cursor),
+            params=[],
+            return_type=return_type,
+            is_const=is_const,
+            is_static=is_static,
+            own=Method.is_mutating(
+                kind, is_const, is_static, maps_return_type(cursor.result_type.spelling)
+            ),
+        )
+
+        args = list(cursor.get_arguments())
+        with self.instrumentation.timer("check_arg_valid"):
+            for arg in args:
+                check_arg_valid(arg, report=self.arg_report)
+
+        method.params = [to_method_param(arg) for arg in args]
+
+        return method
+
+    def collect(
+        self, ast: TranslationUnit, class_names: Optional[Set[str]] = None
+    ) -> Dict[str, ClassInterface]:
+        # Collect public constructors and methods of `class_names` (or all classes) into `data`
+        instrumentation = self.instrumentation
+        cursor_filter = CursorFilter(
+            METHOD_CURSOR_KINDS,
+            namespaces=self.namespaces,
+            classes=frozenset(class_names) if class_names is not None else None,
+        )
+        with instrumentation.profile():
+            for cursor in self.walk(ast, cursor_filter):
+                check_valid(cursor)
+                class_cursor = cursor.lexical_parent
+                if class_cursor.kind not in CLASS_CURSOR_KINDS:
+                    # an out-of-line definition, already collected from its class
+                    continue
+                if class_names is not None and class_cursor.spelling not in class_names:
+                    continue
+
+                with instrumentation.timer("collect_method"):
+                    class_type = self.find_or_create_type(
+                        class_cursor.spelling, class_cursor.type
+                    )
+                    class_type.methods.append(self.collect_method(cursor))
+                instrumentation.count("methods_collected")
+
+        return self.data
+
+    def merge(
+        self,
+        data: Dict[str, ClassInterface],
+        class_headers: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, ClassInterface]:
+        # Merge results of other collectors, the same class may come from several of them
+        for type_name_lean, header in (class_headers or {}).items():
+            self.class_headers.setdefault(type_name_lean, header)
+
+        for type_name_lean, class_interface in data.items():
+            if type_name_lean not in self.data:
+                self.data[type_name_lean] = class_interface
+                continue
+
+            methods = self.data[type_name_lean].type.methods
+            for method in class_interface.type.methods:
+                if method not in methods:
+                    methods.append(method)
+
+        return self.data
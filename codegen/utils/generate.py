@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Union
+
+from utils.instrument import NULL_INSTRUMENTATION, Instrumentation, NullInstrumentation
+from utils.interface import ClassInterface
+from utils.paths import dir_codegen_build
+from utils.render import Renderer, as_dict, dir_templates, get_renderer
+from utils.type_map import load_classes
+
+MANIFEST_FILE: Path = dir_codegen_build / "manifest.json"
+
+
+def digest(content: Union[str, bytes]) -> str:
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def interface_digest(interface: Dict[str, Any]) -> str:
+    return digest(json.dumps(interface, sort_keys=True, ensure_ascii=False))
+
+
+def templates_digest(templates_dir: Path = dir_templates) -> str:
+    # Templates include each other, so any change of any template counts
+    return digest(
+        "".join(
+            f"{path.relative_to(templates_dir)}\0{digest(path.read_bytes())}\n"
+            for path in sorted(templates_dir.rglob("*.j2"))
+        )
+    )
+
+
+def write_if_changed(path: Path, content: str) -> bool:
+    # Leave the file untouched when the bytes are the same, so that Lake and clang++ don't rebuild it
+    data = content.encode("utf-8")
+    if path.exists() and path.read_bytes() == data:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return True
+
+
+def output_paths(
+    interface: Dict[str, Any], out_dirs: Dict[str, Path]
+) -> Dict[str, Path]:
+    type_name_lean = interface["type"]["lean"]
+    paths = {}
+    if "cpp" in out_dirs:
+        paths["cpp"] = out_dirs["cpp"] / f"{type_name_lean}.cpp"
+    if "lean" in out_dirs:
+        paths["lean"] = (
+            out_dirs["lean"] / interface["namespace"] / f"{type_name_lean}.lean"
+        )
+    return paths
+
+
+def classes_paths(namespace: str, out_dirs: Dict[str, Path]) -> Dict[str, Path]:
+    # Files shared by all classes, next to theirs
+    paths = {}
+    if "cpp" in out_dirs:
+        paths["cpp"] = out_dirs["cpp"] / "Classes.cpp"
+    if "lean" in out_dirs:
+        paths["lean"] = out_dirs["lean"] / namespace / "Classes.lean"
+    return paths
+
+
+# Content hashes of inputs and outputs of every generated class, to skip classes that didn't change
+class GenerationManifest:
+    path: Optional[Path]
+    entries: Dict[str, Dict[str, Any]]
+
+    def __init__(self, path: Optional[Path] = MANIFEST_FILE):
+        self.path = path
+        self.entries = {}
+        if path is not None and path.exists():
+            try:
+                self.entries = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError:
+                self.entries = {}
+
+    def is_up_to_date(self, class_name: str, inputs: Dict[str, Optional[str]]) -> bool:
+        entry = self.entries.get(class_name)
+        if entry is None or entry["inputs"] != inputs:
+            return False
+        for output, output_digest in entry["outputs"].items():
+            path = Path(output)
+            if not path.exists() or digest(path.read_bytes()) != output_digest:
+                return False
+        return True
+
+    def update(
+        self,
+        class_name: str,
+        inputs: Dict[str, Optional[str]],
+        outputs: Dict[str, str],
+    ) -> None:
+        self.entries[class_name] = {"inputs": inputs, "outputs": outputs}
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        write_if_changed(self.path, json.dumps(self.entries, indent=2, sort_keys=True))
+
+
+def generate(
+    interfaces: Mapping[str, Union[ClassInterface, Dict[str, Any]]],
+    out_dirs: Dict[str, Path],
+    manifest: Optional[GenerationManifest] = None,
+    header_digests: Optional[Dict[str, str]] = None,
+    renderer: Optional[Renderer] = None,
+    instrumentation: Union[Instrumentation, NullInstrumentation] = NULL_INSTRUMENTATION,
+    classes: Optional[Iterable[str]] = None,
+) -> List[Path]:
+    # Render the bindings of every class, but only rewrite what changed, returns the written files.
+    # The external classes of `classes` (by default those of type_map.yml) and of the generated ones
+    # are registered together, once, by a module initializer.
+    if manifest is None:
+        manifest = GenerationManifest(None)
+    if renderer is None:
+        renderer = get_renderer()
+    template_digest = templates_digest(renderer.templates_dir)
+
+    outdated: Dict[str, Dict[str, Any]] = {}
+    class_paths: Dict[str, Dict[str, Path]] = {}
+    class_inputs: Dict[str, Dict[str, Optional[str]]] = {}
+    all_classes: Set[str] = set()
+    namespace: Optional[str] = None
+    for class_name, class_interface in interfaces.items():
+        with instrumentation.timer("to_dict"):
+            interface = as_dict(class_interface)
+        all_classes.add(interface["type"]["cpp"])
+        namespace = interface["namespace"]
+        paths = output_paths(interface, out_dirs)
+        inputs = {
+            "header": (header_digests or {}).get(class_name),
+            "interface": interface_digest(interface),
+            "templates": template_digest,
+            "outputs": ",".join(sorted(str(path) for path in paths.values())),
+        }
+        if manifest.is_up_to_date(class_name, inputs):
+            instrumentation.count("classes_up_to_date")
+            continue
+        outdated[class_name] = interface
+        class_paths[class_name] = paths
+        class_inputs[class_name] = inputs
+
+    # Only the outdated classes are rendered, in one batch
+    with instrumentation.timer("render"):
+        rendered = renderer.render_all(outdated, kinds=out_dirs.keys())
+
+    written: List[Path] = []
+    for class_name, contents in rendered.items():
+        paths = class_paths[class_name]
+        outputs = {}
+        for kind, content in contents.items():
+            path = paths[kind]
+            with instrumentation.timer("write"):
+                changed = write_if_changed(path, content)
+            if changed:
+                written.append(path)
+            outputs[str(path)] = digest(content)
+        manifest.update(class_name, class_inputs[class_name], outputs)
+
+    if namespace is not None:
+        all_classes.update(load_classes() if classes is None else classes)
+        for kind, path in classes_paths(namespace, out_dirs).items():
+            content = renderer.render_classes(namespace, sorted(all_classes), kind)
+            if write_if_changed(path, content):
+                written.append(path)
+
+    manifest.save()
+    return written
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from dataclasses import astuple, dataclass
+from pathlib import Path
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Tuple, Union
+
+from clang.cindex import AccessSpecifier, Cursor, CursorKind, TranslationUnit
+from utils.collector import EntityCollector, ParseSession
+from utils.paths import dir_codegen_build
+from utils.types import get_type_registry, to_lean_method_name, to_lean_type_name
+from utils.visitor import CLASS_CURSOR_KINDS, CursorFilter
+
+INDEX_FILE: Path = dir_codegen_build / "symbols.sqlite"
+
+# Bump this when the schema changes, older databases are then rebuilt
+SCHEMA_VERSION = 1
+
+# Declarations kept in the index, of every access
+INDEXED_CURSOR_KINDS: FrozenSet[CursorKind] = frozenset(
+    {
+        CursorKind.STRUCT_DECL,
+        CursorKind.TYPEDEF_DECL,
+        CursorKind.CLASS_DECL,
+        CursorKind.CLASS_TEMPLATE,
+        CursorKind.CONSTRUCTOR,
+        CursorKind.DESTRUCTOR,
+        CursorKind.CXX_METHOD,
+    }
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    version TEXT PRIMARY KEY,
+    headers TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS declarations (
+    version TEXT NOT NULL REFERENCES versions(version) ON DELETE CASCADE,
+    usr TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    class TEXT,
+    name TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    result_type TEXT,
+    file TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    access TEXT,
+    brief_comment TEXT,
+    lean_name TEXT,
+    lean_type TEXT,
+    PRIMARY KEY (version, usr)
+);
+CREATE INDEX IF NOT EXISTS declarations_usr ON declarations(usr);
+CREATE INDEX IF NOT EXISTS declarations_kind ON declarations(version, kind);
+CREATE INDEX IF NOT EXISTS declarations_class ON declarations(version, class);
+CREATE INDEX IF NOT EXISTS declarations_name ON declarations(version, name);
+CREATE INDEX IF NOT EXISTS declarations_file ON declarations(version, file);
+"""
+
+# Declarations of a version (the 1st parameter) whose USR is not in another (the 2nd one)
+DIFF_SQL = """
+SELECT * FROM declarations AS a WHERE version = ?
+AND NOT EXISTS (SELECT 1 FROM declarations AS b WHERE b.version = ? AND b.usr = a.usr)
+ORDER BY class, name, signature
+"""
+DIFF_PUBLIC_SQL = """
+SELECT * FROM declarations AS a WHERE version = ? AND (access IS NULL OR access = 'PUBLIC')
+AND NOT EXISTS (SELECT 1 FROM declarations AS b WHERE b.version = ? AND b.usr = a.usr)
+ORDER BY class, name, signature
+"""
+
+
+# A row of `declarations`. `class` is the class of members, `access` is None outside of classes,
+# and `lean_type` is None when a parameter or the result has no mapping in type_map.yml.
+@dataclass(frozen=True)
+class Declaration:
+    usr: str
+    kind: str
+    class_name: Optional[str]
+    name: str
+    signature: str
+    result_type: Optional[str]
+    file: str
+    line: int
+    access: Optional[str]
+    brief_comment: Optional[str]
+    lean_name: Optional[str]
+    lean_type: Optional[str]
+
+
+def lean_mapping(cursor: Cursor) -> Tuple[Optional[str], Optional[str]]:
+    # (Lean name, Lean type) of a declaration, the type of methods is curried like in Lean
+    if cursor.kind in CLASS_CURSOR_KINDS or cursor.kind == CursorKind.TYPEDEF_DECL:
+        return to_lean_type_name(cursor.spelling, cursor.type), None
+    if cursor.kind == CursorKind.DESTRUCTOR:
+        return None, None
+
+    registry = get_type_registry()
+    types: List[Optional[str]] = []
+    for arg in cursor.get_arguments():
+        param_mapping = registry.param(arg.type.spelling, record=False)
+        types.append(param_mapping.lean if param_mapping is not None else None)
+    if cursor.kind == CursorKind.CONSTRUCTOR:
+        class_cursor = cursor.semantic_parent
+        types.append(to_lean_type_name(class_cursor.spelling, class_cursor.type))
+    else:
+        return_mapping = registry.ret(cursor.result_type.spelling, record=False)
+        types.append(return_mapping.lean if return_mapping is not None else None)
+    known_types = [lean for lean in types if lean is not None]
+    lean_type = " → ".join(known_types) if len(known_types) == len(types) else None
+    return to_lean_method_name(cursor.spelling, cursor), lean_type
+
+
+def to_declaration(cursor: Cursor) -> Declaration:
+    kind = cursor.kind
+    is_function = kind in [
+        CursorKind.CONSTRUCTOR,
+        CursorKind.DESTRUCTOR,
+        CursorKind.CXX_METHOD,
+    ]
+    parent = cursor.semantic_parent
+    access = cursor.access_specifier
+    lean_name, lean_type = lean_mapping(cursor)
+    return Declaration(
+        usr=cursor.get_usr(),
+        kind=kind.name,
+        class_name=parent.spelling if parent.kind in CLASS_CURSOR_KINDS else None,
+        name=cursor.spelling,
+        # e.g. `get_name() const`
+        signature=(
+            cursor.displayname + (" const" if cursor.is_const_method() else "")
+            if is_function
+            else cursor.type.spelling
+        ),
+        result_type=cursor.result_type.spelling
+        if kind == CursorKind.CXX_METHOD
+        else None,
+        file=cursor.location.file.name,
+        line=cursor.location.line,
+        access=access.name if access != AccessSpecifier.INVALID else None,
+        brief_comment=cursor.brief_comment,
+        lean_name=lean_name,
+        lean_type=lean_type,
+    )
+
+
+# Declarations of headers, by version, in a SQLite database with an index on every column
+# that is looked up, so that questions about the headers are queries instead of walks, e.g.
+# `SELECT signature FROM declarations WHERE version = ? AND class = 'symbol' AND access = 'PUBLIC'`.
+class SymbolIndex:
+    path: Union[str, Path]
+    connection: sqlite3.Connection
+
+    def __init__(self, path: Union[str, Path] = INDEX_FILE):
+        # ":memory:" for an index that is not kept
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(path))
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] not in [
+            0,
+            SCHEMA_VERSION,
+        ]:
+            self.connection.executescript(
+                "DROP TABLE IF EXISTS declarations; DROP TABLE IF EXISTS versions;"
+            )
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> SymbolIndex:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def declarations(
+        self, collector: EntityCollector, ast: TranslationUnit
+    ) -> Iterator[Declaration]:
+        cursor_filter = CursorFilter(
+            INDEXED_CURSOR_KINDS, access=None, namespaces=collector.namespaces
+        )
+        for cursor in collector.walk(ast, cursor_filter):
+            if cursor.kind in CLASS_CURSOR_KINDS:
+                # forward declarations have the USR of the definition
+                if not cursor.is_definition():
+                    continue
+            elif cursor.kind != CursorKind.TYPEDEF_DECL:
+                # and out-of-line definitions the USR of the declaration
+                if cursor.lexical_parent.kind not in CLASS_CURSOR_KINDS:
+                    continue
+            yield to_declaration(cursor)
+
+    def add(
+        self,
+        version: str,
+        headers: Iterable[Union[str, Path]],
+        session: Optional[ParseSession] = None,
+        namespaces: Optional[Iterable[str]] = None,
+    ) -> int:
+        # (Re)indexes `version` from `headers`, returns the number of declarations.
+        # Headers included by several of them are walked once.
+        headers = [str(header) for header in headers]
+        collector = EntityCollector(
+            recursive=True, session=session, namespaces=namespaces
+        )
+        with self.connection:
+            self.connection.execute("DELETE FROM versions WHERE version = ?", [version])
+            self.connection.execute(
+                "INSERT INTO versions VALUES (?, ?)", [version, json.dumps(headers)]
+            )
+            count = 0
+            for header in headers:
+                rows = [
+                    (version, *astuple(declaration))
+                    for declaration in self.declarations(
+                        collector, collector.parse(header)
+                    )
+                ]
+                # a declaration included by several headers is indexed once
+                count += self.connection.executemany(
+                    "INSERT OR IGNORE INTO declarations VALUES"
+                    " (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                ).rowcount
+        return count
+
+    def versions(self) -> List[str]:
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT version FROM versions ORDER BY version"
+            )
+        ]
+
+    def query(self, sql: str, parameters: Iterable = ()) -> List[Declaration]:
+        # `sql` selects whole rows of `declarations`, e.g. `SELECT * FROM declarations WHERE ...`
+        return [
+            Declaration(*row[1:])
+            for row in self.connection.execute(sql, list(parameters))
+        ]
+
+    def methods(self, version: str, class_name: str) -> List[Declaration]:
+        # Public constructors and methods of a class, in the order of the headers
+        return self.query(
+            "SELECT * FROM declarations WHERE version = ? AND class = ?"
+            " AND kind IN ('CONSTRUCTOR', 'CXX_METHOD') AND access = 'PUBLIC'"
+            " ORDER BY file, line",
+            [version, class_name],
+        )
+
+    def diff(
+        self, old: str, new: str, public: bool = True
+    ) -> Tuple[List[Declaration], List[Declaration]]:
+        # (removed, added) declarations from version `old` to `new`, by USR,
+        # so changing the parameters of a method removes it and adds another one
+        sql = DIFF_PUBLIC_SQL if public else DIFF_SQL
+        return self.query(sql, [old, new]), self.query(sql, [new, old])
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ContextManager, Dict, Iterator, Optional
+
+from utils.paths import dir_codegen_build
+
+if TYPE_CHECKING:
+    # not imported at runtime, so that rendering never loads libclang
+    from clang.cindex import Cursor
+
+# Set to enable instrumentation without changing code, e.g. `GINAC_LEAN_INSTRUMENT=1 pytest ...`
+INSTRUMENT_ENV = "GINAC_LEAN_INSTRUMENT"
+# Set to a file name to also dump cProfile stats of `EntityCollector.collect` there
+PROFILE_ENV = "GINAC_LEAN_PROFILE"
+
+REPORT_FILE: Path = dir_codegen_build / "instrument.json"
+
+
+# Counters and timers of the phases of codegen, overall and per header, to tell which part of a run is slow
+class Instrumentation:
+    enabled: bool = True
+    counters: Counter
+    timers: Dict[str, float]
+    headers: Dict[str, Dict[str, float]]
+    cursor_kinds: Counter
+
+    def __init__(self, profile_file: Optional[Path] = None):
+        self.counters = Counter()
+        self.timers = {}
+        self.headers = {}
+        self.cursor_kinds = Counter()
+        self.lock = threading.Lock()
+        self.profile_file = profile_file
+        self.profiler = None
+        if profile_file is not None:
+            # only imported when profiling, it's not needed otherwise
+            import cProfile  # pylint: disable=import-outside-toplevel
+
+            self.profiler = cProfile.Profile()
+        self.profile_depth = 0
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[name] += value
+
+    def add_time(
+        self, phase: str, seconds: float, header: Optional[str] = None
+    ) -> None:
+        with self.lock:
+            self.timers[phase] = self.timers.get(phase, 0.0) + seconds
+            if header is not None:
+                header_timers = self.headers.setdefault(header, {})
+                header_timers[phase] = header_timers.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, phase: str, header: Optional[str] = None) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start, header)
+
+    def count_cursors(
+        self,
+        cursors: Iterator[Cursor],
+        phase: str = "walk",
+        header: Optional[str] = None,
+    ) -> Iterator[Cursor]:
+        # Times only the traversal itself, not what the consumer does with each cursor
+        while True:
+            start = time.perf_counter()
+            try:
+                cursor = next(cursors)
+            except StopIteration:
+                self.add_time(phase, time.perf_counter() - start, header)
+                return
+            self.add_time(phase, time.perf_counter() - start, header)
+            with self.lock:
+                self.cursor_kinds[cursor.kind.name] += 1
+            yield cursor
+
+    @contextmanager
+    def profile(self) -> Iterator[None]:
+        # Nested calls are profiled once, by the outermost one
+        if self.profiler is None:
+            yield
+            return
+        with self.lock:
+            self.profile_depth += 1
+            if self.profile_depth == 1:
+                self.profiler.enable()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.profile_depth -= 1
+                if self.profile_depth == 0:
+                    self.profiler.disable()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "counters": dict(sorted(self.counters.items())),
+                "timers": dict(sorted(self.timers.items())),
+                "headers": {
+                    header: dict(sorted(timers.items()))
+                    for header, timers in sorted(self.headers.items())
+                },
+                "cursor_kinds": dict(self.cursor_kinds.most_common()),
+            }
+
+    def save(self, path: Path = REPORT_FILE) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+        if self.profiler is not None:
+            self.profiler.dump_stats(str(self.profile_file))
+
+
+# Stands in when instrumentation is disabled, so that hooks cost a method call and nothing else.
+# Its methods take the same arguments as those of `Instrumentation`, and ignore them.
+class NullInstrumentation:  # pylint: disable=unused-argument
+    enabled: bool = False
+    _null_context: ContextManager[None] = nullcontext()
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+    def add_time(
+        self, phase: str, seconds: float, header: Optional[str] = None
+    ) -> None:
+        pass
+
+    def timer(self, phase: str, header: Optional[str] = None) -> ContextManager[None]:
+        return self._null_context
+
+    def count_cursors(
+        self,
+        cursors: Iterator[Cursor],
+        phase: str = "walk",
+        header: Optional[str] = None,
+    ) -> Iterator[Cursor]:
+        return cursors
+
+    def profile(self) -> ContextManager[None]:
+        return self._null_context
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {}
+
+    def save(self, path: Path = REPORT_FILE) -> None:
+        pass
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+
+def create_instrumentation(enabled: Optional[bool] = None):
+    # `enabled=None` defers to the environment
+    if enabled is None:
+        enabled = INSTRUMENT_ENV in os.environ or PROFILE_ENV in os.environ
+    if not enabled:
+        return NULL_INSTRUMENTATION
+    profile_file = os.environ.get(PROFILE_ENV)
+    return Instrumentation(Path(profile_file) if profile_file else None)
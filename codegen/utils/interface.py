@@ -1,13 +1,8 @@
 from __future__ import annotations
 
-import os
-import re
 import sys
-from dataclasses import dataclass, field
-from pathlib import Path
-from typing import Any, Dict, Generator, Iterator, List, Optional, Sequence, Set
-
-import yaml
+from dataclasses import dataclass
+from typing import Any, Dict, List, Set, Tuple
 
 # TODO: it would be nice to use a library for converting from/to YAML,
 # e.g. https://dataclass-wizard.readthedocs.io/en/latest/common_use_cases/wizard_mixins.html#yamlwizard
@@ -15,28 +10,78 @@ import yaml
 # https://github.com/rnag/dataclass-wizard/issues/89
 
 
-@dataclass
+# A few types like `const std::string &` are used by thousands of parameters, so types are immutable
+# and interned: equal types are the same object, shared by all parameters and methods using them.
+_param_types: Dict[Tuple[str, str, str], ParamType] = {}
+_return_types: Dict[Tuple[str, str, str], ReturnType] = {}
+
+
+@dataclass(frozen=True, slots=True)
 class ParamType:
     lean: str
     cpp: str
     from_lean: str
 
+    @staticmethod
+    def interned(lean: str, cpp: str, from_lean: str) -> ParamType:
+        key = (lean, cpp, from_lean)
+        param_type = _param_types.get(key)
+        if param_type is None:
+            param_type = _param_types.setdefault(
+                key, ParamType(sys.intern(lean), sys.intern(cpp), sys.intern(from_lean))
+            )
+        return param_type
+
+    def __reduce__(self):
+        # Unpickled in the parent process, results of worker processes share types too
+        return (ParamType.interned, (self.lean, self.cpp, self.from_lean))
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> ParamType:
+        return ParamType.interned(
+            lean=data["lean"], cpp=data["cpp"], from_lean=data["from_lean"]
+        )
+
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ReturnType:
     lean: str
     cpp: str
     to_lean: str
 
-
-@dataclass
+    @staticmethod
+    def interned(lean: str, cpp: str, to_lean: str) -> ReturnType:
+        key = (lean, cpp, to_lean)
+        return_type = _return_types.get(key)
+        if return_type is None:
+            return_type = _return_types.setdefault(
+                key, ReturnType(sys.intern(lean), sys.intern(cpp), sys.intern(to_lean))
+            )
+        return return_type
+
+    def __reduce__(self):
+        # Unpickled in the parent process, results of worker processes share types too
+        return (ReturnType.interned, (self.lean, self.cpp, self.to_lean))
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> ReturnType:
+        # Handwritten interfaces may leave out `to_lean` of constructors, which return as is
+        return ReturnType.interned(
+            lean=data["lean"], cpp=data["cpp"], to_lean=data.get("to_lean", "%s")
+        )
+
+
+@dataclass(frozen=True, slots=True)
 class MethodParam:
     name: str
     type: ParamType
+    # Whether the Lean object is passed owned (`lean_obj_arg`) instead of borrowed (`b_lean_obj_arg`)
+    own: bool = False
 
     def to_dict(self: MethodParam):
         return {
             "name": self.name,
+            "own": self.own,
             "type": {
                 "lean": self.type.lean,
                 "cpp": self.type.cpp,
@@ -44,20 +89,53 @@ class MethodParam:
             },
         }
 
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> MethodParam:
+        return MethodParam(
+            name=data["name"],
+            type=ParamType.from_dict(data["type"]),
+            own=data.get("own", False),
+        )
+
 
-@dataclass
+@dataclass(slots=True)
 class Method:
     kind: str
     lean: str
     cpp: str
     params: List[MethodParam]
     return_type: ReturnType
+    is_const: bool = False
+    is_static: bool = False
+    # Whether the receiver is owned, so that it can be mutated in place when it's exclusive
+    own: bool = False
+    # Whether to also emit `{lean}Batch`, mapping over Lean `Array`s in a single FFI call
+    batch: bool = False
+
+    @staticmethod
+    def is_mutating(
+        kind: str, is_const: bool, is_static: bool, maps_result: bool
+    ) -> bool:
+        # Only non-const member functions can change the receiver. The receiver is returned along
+        # with the result, so the result has to map to Lean, unlike e.g. references to internals.
+        return kind == "CXX_METHOD" and not is_const and not is_static and maps_result
+
+    def can_batch(self) -> bool:
+        # Constructors zip arrays of their arguments, methods map over an array of receivers
+        # with the same arguments. Mutating methods would need to consume the array, so they are not batched.
+        if self.kind == "CONSTRUCTOR":
+            return len(self.params) > 0
+        return self.kind == "CXX_METHOD" and not self.is_static and not self.own
 
     def to_dict(self) -> Dict[str, Any]:
         return {
             "kind": self.kind,
             "lean": self.lean,
             "cpp": self.cpp,
+            "is_const": self.is_const,
+            "is_static": self.is_static,
+            "own": self.own,
+            "batch": self.batch,
             "params": [param.to_dict() for param in self.params],
             "return_type": {
                 "lean": self.return_type.lean,
@@ -66,15 +144,50 @@ class Method:
             },
         }
 
-
-@dataclass
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> Method:
+        return Method(
+            kind=data["kind"],
+            lean=data["lean"],
+            cpp=data["cpp"],
+            params=[MethodParam.from_dict(param) for param in data.get("params", [])],
+            return_type=ReturnType.from_dict(data["return_type"]),
+            is_const=data.get("is_const", False),
+            is_static=data.get("is_static", False),
+            own=data.get("own", False),
+            batch=data.get("batch", False),
+        )
+
+
+@dataclass(slots=True)
 class ClassType:
     lean: str
     cpp: str
     methods: List[Method]
 
-
-@dataclass
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> ClassType:
+        return ClassType(
+            lean=data["lean"],
+            cpp=data["cpp"],
+            methods=[Method.from_dict(method) for method in data.get("methods", [])],
+        )
+
+    def enable_batch(self, method_names: Set[str]) -> None:
+        # Emit batched variants of the methods with these C++ names (all overloads)
+        for method in self.methods:
+            if method.cpp not in method_names:
+                continue
+            if method.can_batch():
+                method.batch = True
+            else:
+                print(
+                    f"WARN Can't batch {self.cpp}::{method.cpp}, it's static, mutating or without arguments",
+                    file=sys.stderr,
+                )
+
+
+@dataclass(slots=True)
 class ClassInterface:
     namespace: str
     deps: List[Dict[str, str]]
@@ -90,3 +203,11 @@ class ClassInterface:
                 "methods": [method.to_dict() for method in self.type.methods],
             },
         }
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> ClassInterface:
+        return ClassInterface(
+            namespace=data["namespace"],
+            deps=list(data.get("deps", [])),
+            type=ClassType.from_dict(data["type"]),
+        )
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set, Tuple, Union
+
+from utils.collector import EntityCollector, ParseSession
+from utils.interface import ClassInterface
+from utils.pch import PrecompiledHeader
+
+# One session per worker process, so the Index and include paths are set up once per worker
+_worker_session: Optional[ParseSession] = None  # pylint: disable=invalid-name
+
+
+def _init_worker(
+    cache_dir: Optional[Path],
+    cpp_include_paths: List[str],
+    include_dirs: List[Union[str, Path]],
+    pch: Optional[PrecompiledHeader],
+) -> None:
+    global _worker_session  # pylint: disable=global-statement
+    _worker_session = ParseSession(
+        cache_dir,
+        cpp_include_paths=cpp_include_paths,
+        include_dirs=include_dirs,
+        pch=pch,
+    )
+
+
+def _collect_header(
+    header: Union[str, Path],
+    recursive: bool,
+    single_parse: bool,
+    class_names: Optional[Set[str]],
+    namespaces: Optional[FrozenSet[str]],
+) -> Tuple[Dict[str, ClassInterface], Dict[str, str]]:
+    # Every header is collected by a fresh collector, so the result doesn't depend on
+    # which other headers the same worker happened to process before
+    collector = EntityCollector(
+        recursive,
+        single_parse=single_parse,
+        session=_worker_session,
+        namespaces=namespaces,
+    )
+
+    ast = collector.parse(header)
+    # libclang objects are not picklable, only the plain interface data is sent back
+    return collector.collect(ast, class_names), collector.class_headers
+
+
+def collect_headers_in_parallel(
+    collector: EntityCollector,
+    headers: Sequence[Union[str, Path]],
+    class_names: Optional[Set[str]] = None,
+    max_workers: Optional[int] = None,
+) -> Dict[str, ClassInterface]:
+    session = collector.session
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(
+            session.cache_dir,
+            session.cpp_include_paths,
+            session.include_dirs,
+            session.pch,
+        ),
+    ) as executor:
+        # `map` keeps the order of `headers`, so the merged result is deterministic
+        for data, class_headers in executor.map(
+            _collect_header,
+            headers,
+            [collector.recursive] * len(headers),
+            [collector.single_parse] * len(headers),
+            [class_names] * len(headers),
+            [collector.namespaces] * len(headers),
+        ):
+            collector.merge(data, class_headers)
+
+    return collector.data
@@ -0,0 +1,6 @@
+from pathlib import Path
+
+dir_root: Path = Path(__file__).resolve().parent.parent.parent
+dir_build: Path = dir_root / ".lake" / "build"
+# Where codegen keeps its caches, next to what Lake builds
+dir_codegen_build: Path = dir_build / "codegen"
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+from clang.cindex import Index, TranslationUnit
+from utils.cache import TranslationUnitCache
+from utils.paths import dir_codegen_build
+
+# The prefix shared by every GiNaC class header
+DEFAULT_PREFIX_INCLUDES: Tuple[str, ...] = (
+    "string",
+    "vector",
+    "cln/cln.h",
+    "ginac/basic.h",
+)
+
+
+# A clang precompiled header for the GiNaC/CLN prefix, built once with libclang and passed to
+# every per-class parse with `-include-pch`. It's rebuilt when any header it includes changes,
+# and `scripts/build_ginac.sh`/`scripts/build_cln.sh` remove it after installing the headers.
+class PrecompiledHeader:
+    pch_dir: Path
+    includes: List[str]
+
+    def __init__(
+        self,
+        pch_dir: Path = dir_codegen_build / "pch",
+        includes: Sequence[str] = DEFAULT_PREFIX_INCLUDES,
+    ):
+        self.pch_dir = Path(pch_dir)
+        self.includes = list(includes)
+        # Saved translation units parsed as incomplete are precompiled headers, so they're
+        # kept, and invalidated, the same way as cached translation units
+        self.tu_cache = TranslationUnitCache(self.pch_dir)
+
+    @property
+    def prefix_header(self) -> Path:
+        return self.pch_dir / "prefix.h"
+
+    def write_prefix_header(self) -> None:
+        content = "".join(f"#include <{include}>\n" for include in self.includes)
+        # Keep the mtime when unchanged, or the precompiled header would be outdated
+        if (
+            not self.prefix_header.exists()
+            or self.prefix_header.read_text(encoding="utf-8") != content
+        ):
+            self.pch_dir.mkdir(parents=True, exist_ok=True)
+            self.prefix_header.write_text(content, encoding="utf-8")
+
+    def path(self, args: List[str]) -> Path:
+        return self.tu_cache.ast_path(self.tu_cache.key(self.prefix_header, args))
+
+    def is_up_to_date(self, args: List[str]) -> bool:
+        return self.tu_cache.is_valid(self.prefix_header, args)
+
+    def ensure(self, index: Index, args: List[str]) -> Path:
+        self.write_prefix_header()
+        if not self.is_up_to_date(args):
+            print(f"Building precompiled header for {', '.join(self.includes)}...")
+            ast = index.parse(
+                self.prefix_header,
+                args=args,
+                options=TranslationUnit.PARSE_INCOMPLETE,
+            )
+            self.tu_cache.save(ast, self.prefix_header, args)
+            if not self.is_up_to_date(args):
+                raise RuntimeError(
+                    f"Failed to build precompiled header {self.path(args)}"
+                )
+
+        return self.path(args)
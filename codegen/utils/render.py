@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Mapping, Optional, Union
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+from utils.interface import ClassInterface
+from utils.paths import dir_codegen_build
+
+dir_templates: Path = Path(__file__).resolve().parent.parent / "templates"
+
+# Output kind => template
+CLASS_TEMPLATES: Dict[str, str] = {
+    "cpp": "cpp/class.cpp.j2",
+    "lean": "lean/class.lean.j2",
+}
+
+# Output kind => template of the files shared by all classes, see `render_classes`
+CLASSES_TEMPLATES: Dict[str, str] = {
+    "cpp": "cpp/classes.cpp.j2",
+    "lean": "lean/classes.lean.j2",
+}
+
+# Compiled templates are kept across processes, keyed by template name and source checksum
+BYTECODE_CACHE_DIR: Path = dir_codegen_build / "jinja"
+
+
+def create_environment(
+    templates_dir: Path = dir_templates, bytecode_cache_dir: Optional[Path] = None
+) -> Environment:
+    bytecode_cache = None
+    if bytecode_cache_dir is not None:
+        bytecode_cache_dir.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(str(bytecode_cache_dir))
+    return Environment(
+        loader=FileSystemLoader(templates_dir),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        bytecode_cache=bytecode_cache,
+    )
+
+
+def as_dict(class_interface: Union[ClassInterface, Dict[str, Any]]) -> Dict[str, Any]:
+    if isinstance(class_interface, ClassInterface):
+        return class_interface.to_dict()
+    return class_interface
+
+
+# Renders class interfaces with templates that are compiled once, meant to be created once per process,
+# see `get_renderer`. Rendering a compiled template is thread-safe, so batches can use a thread pool.
+class Renderer:
+    env: Environment
+    templates: Dict[str, Template]
+    classes_templates: Dict[str, Template]
+    max_workers: Optional[int]
+
+    def __init__(
+        self,
+        templates_dir: Path = dir_templates,
+        bytecode_cache_dir: Optional[Path] = BYTECODE_CACHE_DIR,
+        max_workers: Optional[int] = None,
+    ):
+        self.templates_dir = templates_dir
+        self.env = create_environment(templates_dir, bytecode_cache_dir)
+        # Looked up once, instead of checking whether the source changed on every render
+        self.templates = {
+            kind: self.env.get_template(template)
+            for kind, template in CLASS_TEMPLATES.items()
+        }
+        self.classes_templates = {
+            kind: self.env.get_template(template)
+            for kind, template in CLASSES_TEMPLATES.items()
+        }
+        self.max_workers = max_workers
+
+    def render(
+        self, kind: str, class_interface: Union[ClassInterface, Dict[str, Any]]
+    ) -> str:
+        return self.templates[kind].render(**as_dict(class_interface))
+
+    def render_classes(self, namespace: str, classes: Iterable[str], kind: str) -> str:
+        # The registration of the external classes of all `classes`, by C++ name
+        return self.classes_templates[kind].render(
+            namespace=namespace, classes=list(classes)
+        )
+
+    def render_class(
+        self,
+        class_interface: Union[ClassInterface, Dict[str, Any]],
+        kinds: Optional[Iterable[str]] = None,
+    ) -> Dict[str, str]:
+        interface = as_dict(class_interface)
+        return {
+            kind: self.render(kind, interface)
+            for kind in (self.templates if kinds is None else kinds)
+        }
+
+    def render_all(
+        self,
+        interfaces: Mapping[str, Union[ClassInterface, Dict[str, Any]]],
+        kinds: Optional[Iterable[str]] = None,
+        max_workers: Optional[int] = None,
+    ) -> Dict[str, Dict[str, str]]:
+        # Class name => output kind => rendered content, in the order of `interfaces`
+        kinds = list(self.templates if kinds is None else kinds)
+        max_workers = self.max_workers if max_workers is None else max_workers
+
+        if max_workers is None or max_workers <= 1 or len(interfaces) <= 1:
+            return {
+                class_name: self.render_class(class_interface, kinds)
+                for class_name, class_interface in interfaces.items()
+            }
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            rendered = executor.map(
+                lambda class_interface: self.render_class(class_interface, kinds),
+                interfaces.values(),
+            )
+            return dict(zip(interfaces.keys(), rendered))
+
+
+_renderer: Optional[Renderer] = None  # pylint: disable=invalid-name
+
+
+def get_renderer() -> Renderer:
+    global _renderer  # pylint: disable=global-statement
+    if _renderer is None:
+        _renderer = Renderer()
+    return _renderer
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+import pickle  # nosec B403
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, Union
+
+import yaml
+from utils.interface import ClassInterface
+
+# libyaml is much faster than the pure Python implementation, but it's an optional part of PyYAML
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper, SafeLoader  # type: ignore[assignment]
+
+# msgpack is in requirements.txt, but without it, pickle is always there. Both are only meant
+# for our own intermediate files, never for untrusted data.
+try:
+    import msgpack  # type: ignore[import]
+except ImportError:
+    msgpack = None
+
+FORMAT_YAML = "yaml"
+FORMAT_JSON = "json"
+FORMAT_MSGPACK = "msgpack"
+FORMAT_PICKLE = "pickle"
+BINARY_FORMATS = [FORMAT_MSGPACK, FORMAT_PICKLE]
+# The binary format of intermediate caches, the fastest available
+FORMAT_BINARY = FORMAT_MSGPACK if msgpack is not None else FORMAT_PICKLE
+
+FORMATS_BY_SUFFIX: Dict[str, str] = {
+    ".yml": FORMAT_YAML,
+    ".yaml": FORMAT_YAML,
+    ".json": FORMAT_JSON,
+    ".jsonl": FORMAT_JSON,
+    ".msgpack": FORMAT_MSGPACK,
+    ".pickle": FORMAT_PICKLE,
+}
+SUFFIXES_BY_FORMAT: Dict[str, str] = {
+    FORMAT_YAML: ".yml",
+    FORMAT_JSON: ".jsonl",
+    FORMAT_MSGPACK: ".msgpack",
+    FORMAT_PICKLE: ".pickle",
+}
+
+InterfaceLike = Union[ClassInterface, Dict[str, Any]]
+
+
+def format_of(path: Union[str, Path]) -> str:
+    suffix = Path(path).suffix
+    if suffix not in FORMATS_BY_SUFFIX:
+        raise ValueError(f"Unknown serialization format of {path}")
+    return FORMATS_BY_SUFFIX[suffix]
+
+
+def as_dict(interface: InterfaceLike) -> Dict[str, Any]:
+    return interface.to_dict() if isinstance(interface, ClassInterface) else interface
+
+
+def dump_interface(
+    interface: InterfaceLike, fmt: str = FORMAT_YAML
+) -> Union[str, bytes]:
+    # The YAML output is the same as `yaml.dump`, which the fixtures were written with
+    data = as_dict(interface)
+    if fmt == FORMAT_YAML:
+        return yaml.dump(data, Dumper=SafeDumper)
+    if fmt == FORMAT_JSON:
+        return json.dumps(data, ensure_ascii=False)
+    if fmt == FORMAT_MSGPACK:
+        return msgpack.packb(data)
+    if fmt == FORMAT_PICKLE:
+        return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    raise ValueError(f"Unknown serialization format {fmt}")
+
+
+def as_bytes(data: Union[str, bytes], fmt: str) -> bytes:
+    if isinstance(data, str):
+        raise TypeError(f"Expected bytes in the binary format {fmt}, got str")
+    return data
+
+
+def load_interface(data: Union[str, bytes], fmt: str = FORMAT_YAML) -> ClassInterface:
+    if fmt == FORMAT_YAML:
+        return ClassInterface.from_dict(yaml.load(data, Loader=SafeLoader))
+    if fmt == FORMAT_JSON:
+        return ClassInterface.from_dict(json.loads(data))
+    if fmt == FORMAT_MSGPACK:
+        return ClassInterface.from_dict(msgpack.unpackb(as_bytes(data, fmt)))
+    if fmt == FORMAT_PICKLE:
+        return ClassInterface.from_dict(pickle.loads(as_bytes(data, fmt)))  # nosec B301
+    raise ValueError(f"Unknown serialization format {fmt}")
+
+
+def dump_interfaces(
+    interfaces: Iterable[InterfaceLike], file: IO, fmt: str = FORMAT_YAML
+) -> int:
+    # Write class by class, as YAML documents, JSON lines or consecutive binary records,
+    # so that neither side has to hold the whole interface of GiNaC. Returns how many were written.
+    # `file` is opened in binary mode for binary formats, in text mode otherwise.
+    count = 0
+    for interface in interfaces:
+        if fmt == FORMAT_YAML:
+            file.write("---\n")
+            file.write(dump_interface(interface, fmt))
+        elif fmt == FORMAT_JSON:
+            file.write(dump_interface(interface, fmt))
+            file.write("\n")
+        elif fmt == FORMAT_MSGPACK:
+            file.write(dump_interface(interface, fmt))
+        elif fmt == FORMAT_PICKLE:
+            pickle.dump(as_dict(interface), file, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            raise ValueError(f"Unknown serialization format {fmt}")
+        count += 1
+    return count
+
+
+def iter_interfaces(file: IO, fmt: str = FORMAT_YAML) -> Iterator[ClassInterface]:
+    if fmt == FORMAT_YAML:
+        for data in yaml.load_all(file, Loader=SafeLoader):
+            if data is not None:
+                yield ClassInterface.from_dict(data)
+    elif fmt == FORMAT_JSON:
+        for line in file:
+            if line.strip():
+                yield ClassInterface.from_dict(json.loads(line))
+    elif fmt == FORMAT_MSGPACK:
+        for data in msgpack.Unpacker(file):
+            yield ClassInterface.from_dict(data)
+    elif fmt == FORMAT_PICKLE:
+        while True:
+            try:
+                data = pickle.load(file)  # nosec B301
+            except EOFError:
+                return
+            yield ClassInterface.from_dict(data)
+    else:
+        raise ValueError(f"Unknown serialization format {fmt}")
+
+
+def save_interfaces(interfaces: Iterable[InterfaceLike], path: Union[str, Path]) -> int:
+    fmt = format_of(path)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if fmt in BINARY_FORMATS:
+        with open(path, "wb") as file:
+            return dump_interfaces(interfaces, file, fmt)
+    with open(path, "w", encoding="utf-8") as file:
+        return dump_interfaces(interfaces, file, fmt)
+
+
+def load_interfaces(path: Union[str, Path]) -> Iterator[ClassInterface]:
+    fmt = format_of(path)
+    if fmt in BINARY_FORMATS:
+        with open(path, "rb") as file:
+            yield from iter_interfaces(file, fmt)
+        return
+    with open(path, "r", encoding="utf-8") as file:
+        yield from iter_interfaces(file, fmt)
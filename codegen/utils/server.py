@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import json
+import os
+import socketserver
+import sys
+import threading
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from utils.collector import EntityCollector, ParseSession
+from utils.generate import GenerationManifest, generate
+from utils.interface import ClassInterface
+from utils.render import Renderer, dir_templates
+from utils.type_map import TYPE_MAP_FILE, load_classes
+from utils.types import reload_type_registry
+
+Stat = Optional[Tuple[int, int]]
+
+
+def stat_file(file_name: str) -> Stat:
+    try:
+        stat = os.stat(file_name)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# Remembers mtime and size of files, cheap enough to be polled on every request.
+# Changes are only acknowledged by `commit`, so that they are seen again if handling them failed.
+class FileWatcher:
+    stats: Dict[str, Stat]
+    polled: Dict[str, Stat]
+
+    def __init__(self):
+        self.stats = {}
+        self.polled = {}
+
+    def poll(self, files: Iterable[str]) -> Set[str]:
+        # Files that changed, appeared or disappeared since the last commit
+        self.polled = {file_name: stat_file(file_name) for file_name in files}
+        return {
+            file_name
+            for file_name in self.polled.keys() | self.stats.keys()
+            if self.polled.get(file_name) != self.stats.get(file_name)
+        }
+
+    def commit(self) -> None:
+        self.stats = self.polled
+
+
+# Keeps a parse session, its translation units and the collected interfaces warm between builds.
+# On each build, only what changed is redone: templates are re-rendered, type mappings re-collected,
+# and units including a changed header are reparsed in place.
+class CodegenServer:
+    headers: List[str]
+    interfaces: Dict[str, ClassInterface]
+    header_digests: Dict[str, str]
+
+    def __init__(
+        self,
+        headers: Iterable[Union[str, Path]],
+        out_dirs: Dict[str, Path],
+        class_names: Optional[Set[str]] = None,
+        namespace: str = "Ginac",
+        cpp_namespaces: Optional[Iterable[str]] = None,
+        session: Optional[ParseSession] = None,
+        manifest: Optional[GenerationManifest] = None,
+        templates_dir: Path = dir_templates,
+        type_map_file: Path = TYPE_MAP_FILE,
+    ):
+        self.headers = [os.path.abspath(header) for header in headers]
+        self.out_dirs = out_dirs
+        self.class_names = class_names
+        self.namespace = namespace
+        self.cpp_namespaces = cpp_namespaces
+        self.session = session if session is not None else ParseSession()
+        self.manifest = manifest if manifest is not None else GenerationManifest()
+        self.templates_dir = templates_dir
+        self.type_map_file = type_map_file
+        self.renderer = Renderer(templates_dir)
+        self.interfaces = {}
+        self.header_digests = {}
+        self.started = False
+        self.builds = 0
+        self.lock = threading.Lock()
+        self.templates = FileWatcher()
+        self.type_map = FileWatcher()
+        self.sources = FileWatcher()
+
+    def template_files(self) -> List[str]:
+        # Globbed on every poll, so that new templates are noticed too
+        return sorted(str(path) for path in self.templates_dir.rglob("*.j2"))
+
+    def source_files(self) -> Set[str]:
+        return {
+            dep for header in self.headers for dep in self.session.dependencies(header)
+        }
+
+    def collect(self) -> None:
+        # A fresh collector each time, the session keeps the units
+        collector = EntityCollector(
+            recursive=True, session=self.session, namespaces=self.cpp_namespaces
+        )
+        for header in self.headers:
+            collector.collect(self.session.parse(header), self.class_names)
+        collector.arg_report.print()
+        for class_interface in collector.data.values():
+            class_interface.namespace = self.namespace
+        self.interfaces = collector.data
+        self.header_digests = collector.header_digests()
+
+    def build(self, render: bool = True) -> Dict[str, Any]:
+        # With `render=False`, nothing is rendered when nothing changed, e.g. when watching
+        with self.lock:
+            result: Dict[str, Any] = {
+                "reparsed": [],
+                "collected": False,
+                "type_map_reloaded": False,
+                "templates_reloaded": False,
+            }
+            watchers = [self.templates, self.type_map, self.sources]
+            if not self.started:
+                self.collect()
+                result["collected"] = True
+                self.templates.poll(self.template_files())
+                self.type_map.poll([str(self.type_map_file)])
+                self.sources.poll(self.source_files())
+            else:
+                changed_templates = self.templates.poll(self.template_files())
+                changed_type_map = self.type_map.poll([str(self.type_map_file)])
+                changed_sources = self.sources.poll(self.source_files())
+                if changed_templates:
+                    self.renderer = Renderer(self.templates_dir)
+                    result["templates_reloaded"] = True
+                if changed_type_map:
+                    reload_type_registry(self.type_map_file)
+                    result["type_map_reloaded"] = True
+                for header in self.headers:
+                    if changed_sources & set(self.session.dependencies(header)):
+                        self.session.reparse(header)
+                        result["reparsed"].append(header)
+                if changed_sources or changed_type_map:
+                    self.collect()
+                    result["collected"] = True
+                    # includes may have changed with the headers
+                    self.sources.poll(self.source_files())
+                if not (render or changed_templates or result["collected"]):
+                    for watcher in watchers:
+                        watcher.commit()
+                    result["written"] = []
+                    return result
+
+            written = generate(
+                self.interfaces,
+                self.out_dirs,
+                self.manifest,
+                self.header_digests,
+                renderer=self.renderer,
+                classes=load_classes(self.type_map_file),
+            )
+            for watcher in watchers:
+                watcher.commit()
+            self.started = True
+            self.builds += 1
+            result["written"] = [str(path) for path in written]
+            return result
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "headers": self.headers,
+            "classes": sorted(self.interfaces),
+            "units": sorted(self.session.units),
+            "builds": self.builds,
+        }
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        command = request.get("command", "build")
+        try:
+            if command == "build":
+                return {"ok": True, **self.build(request.get("render", True))}
+            if command == "status":
+                return {"ok": True, **self.status()}
+            if command == "shutdown":
+                return {"ok": True, "shutdown": True}
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            # the server keeps running, e.g. after a syntax error in a template
+            print(f"WARN {command} failed: {error!r}", file=sys.stderr)
+            return {"ok": False, "error": repr(error)}
+        return {"ok": False, "error": f"Unknown command {command}"}
+
+    def watch(self, interval: float, stop: threading.Event) -> None:
+        # Builds as soon as something changes, until `stop` is set
+        while not stop.wait(interval):
+            result = self.handle({"command": "build", "render": False})
+            for path in result.get("written", []):
+                print(f"INFO Written {path}", file=sys.stderr)
+
+
+def parse_request(line: str) -> Dict[str, Any]:
+    # A JSON object, or just the name of a command
+    line = line.strip()
+    if line.startswith("{"):
+        return json.loads(line)
+    return {"command": line}
+
+
+def serve_stream(server: CodegenServer, input_file: IO, output_file: IO) -> bool:
+    # One request per line, one JSON response per line. Returns whether shutdown was requested.
+    for line in input_file:
+        if not line.strip():
+            continue
+        try:
+            request = parse_request(line)
+        except ValueError as error:
+            response: Dict[str, Any] = {"ok": False, "error": repr(error)}
+        else:
+            response = server.handle(request)
+        output_file.write(json.dumps(response) + "\n")
+        output_file.flush()
+        if response.get("shutdown"):
+            return True
+    return False
+
+
+def serve_socket(server: CodegenServer, socket_path: Path) -> None:
+    # Serves connections one at a time on a Unix socket, e.g. `echo build | nc -U <socket_path>`
+    stopped = threading.Event()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            # Text files of the connection itself, `rfile` and `wfile` are binary
+            input_file = self.connection.makefile("r", encoding="utf-8")
+            output_file = self.connection.makefile("w", encoding="utf-8")
+            with input_file, output_file:
+                if serve_stream(server, input_file, output_file):
+                    stopped.set()
+
+    socket_path.unlink(missing_ok=True)
+    with socketserver.UnixStreamServer(str(socket_path), Handler) as socket_server:
+        print(f"INFO Serving on {socket_path}", file=sys.stderr)
+        try:
+            while not stopped.is_set():
+                socket_server.handle_request()
+        finally:
+            socket_path.unlink(missing_ok=True)
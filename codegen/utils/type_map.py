@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import re
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import yaml
+
+TYPE_MAP_FILE: Path = Path(__file__).resolve().parent.parent / "type_map.yml"
+
+FORM_VALUE = "value"
+FORM_CONST_REF = "const_ref"
+FORM_REF = "ref"
+FORM_RVALUE_REF = "rvalue_ref"
+FORM_CONST_POINTER = "const_pointer"
+FORM_POINTER = "pointer"
+
+# Spelled by libclang or in JSON dumps, but irrelevant to the mapping
+IGNORED_TOKENS = {"const", "volatile", "class", "struct", "&", "&&", "*"}
+STRIPPED_QUALIFIERS = ["GiNaC::"]
+
+
+@dataclass(frozen=True, slots=True)
+class ParamMapping:
+    lean: str
+    from_lean: str
+
+
+@dataclass(frozen=True, slots=True)
+class ReturnMapping:
+    lean: str
+    to_lean: str
+
+
+def canonical_spelling(spelling: str) -> str:
+    # "const  GiNaC::ex&" => "const GiNaC::ex &"
+    return " ".join(re.sub(r"(&&|&|\*)", r" \1 ", spelling).split())
+
+
+def split_spelling(spelling: str) -> Tuple[str, str]:
+    # "const GiNaC::ex &" => ("ex", "const_ref"), "const char *" => ("char", "const_pointer")
+    tokens = canonical_spelling(spelling).split()
+    is_const = "const" in tokens
+    last = tokens[-1] if tokens else ""
+    if last == "&":
+        form = FORM_CONST_REF if is_const else FORM_REF
+    elif last == "&&":
+        form = FORM_RVALUE_REF
+    elif last == "*":
+        form = FORM_CONST_POINTER if is_const else FORM_POINTER
+    else:
+        form = FORM_VALUE
+    base = " ".join(token for token in tokens if token not in IGNORED_TOKENS)
+    for qualifier in STRIPPED_QUALIFIERS:
+        if base.startswith(qualifier):
+            base = base[len(qualifier) :]
+    return base, form
+
+
+def load_classes(path: Union[str, Path] = TYPE_MAP_FILE) -> List[str]:
+    # C++ classes wrapped in Lean external objects, without building a registry
+    with open(path, "r", encoding="utf-8") as file:
+        return list(yaml.safe_load(file).get("classes") or [])
+
+
+def substitute(pattern: str, lean: str, cpp: str) -> str:
+    # Not `str.format`, the patterns are C++ with braces of their own
+    return pattern.replace("{lean}", lean).replace("{cpp}", cpp)
+
+
+# Maps C++ types to their Lean types and FFI conversions, driven by a declarative table (type_map.yml).
+# Lookups are memoized by canonical spelling, and unknown types are only counted, to be summarized once.
+class TypeRegistry:
+    params: Dict[str, Dict[str, ParamMapping]]
+    returns: Dict[str, Dict[str, ReturnMapping]]
+    unknown_params: Counter
+    unknown_returns: Counter
+
+    def __init__(
+        self,
+        table: Dict[str, Any],
+        primitives: Dict[str, str],
+        lean_name: Callable[[str], str],
+    ):
+        # `primitives`: C++ spelling => Lean type, `lean_name`: Lean name of a C++ class
+        self.params = {}
+        self.returns = {}
+        for cpp, entry in (table.get("types") or {}).items():
+            self.add(cpp, entry.get("params") or {}, entry.get("returns") or {})
+        for rules_key, types in [
+            ("primitive_rules", primitives),
+            (
+                "class_rules",
+                {cpp: lean_name(cpp) for cpp in table.get("classes") or []},
+            ),
+        ]:
+            rules = table.get(rules_key) or {}
+            for cpp, lean in types.items():
+                self.add(
+                    cpp,
+                    {
+                        form: {
+                            key: substitute(pattern, lean, cpp)
+                            for key, pattern in rule.items()
+                        }
+                        for form, rule in (rules.get("params") or {}).items()
+                    },
+                    {
+                        form: {
+                            key: substitute(pattern, lean, cpp)
+                            for key, pattern in rule.items()
+                        }
+                        for form, rule in (rules.get("returns") or {}).items()
+                    },
+                    override=False,
+                )
+
+        self.param_cache: Dict[str, Optional[ParamMapping]] = {}
+        self.return_cache: Dict[str, Optional[ReturnMapping]] = {}
+        self.unknown_params = Counter()
+        self.unknown_returns = Counter()
+        # the first location where an unknown type was seen, for the summary
+        self.unknown_locations: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def load(
+        path: Union[str, Path],
+        primitives: Dict[str, str],
+        lean_name: Callable[[str], str],
+    ) -> TypeRegistry:
+        with open(path, "r", encoding="utf-8") as file:
+            return TypeRegistry(yaml.safe_load(file), primitives, lean_name)
+
+    def add(
+        self,
+        cpp: str,
+        params: Dict[str, Dict[str, str]],
+        returns: Dict[str, Dict[str, str]],
+        override: bool = True,
+    ) -> None:
+        # Plug in the mapping of a type, by form, explicit `types` win over rules
+        param_forms = self.params.setdefault(cpp, {})
+        for form, mapping in params.items():
+            if override or form not in param_forms:
+                param_forms[form] = ParamMapping(mapping["lean"], mapping["from_lean"])
+        return_forms = self.returns.setdefault(cpp, {})
+        for form, mapping in returns.items():
+            if override or form not in return_forms:
+                return_forms[form] = ReturnMapping(mapping["lean"], mapping["to_lean"])
+        # mappings changed, so do memoized lookups
+        self.param_cache = {}
+        self.return_cache = {}
+
+    def param(
+        self, spelling: str, location: Optional[str] = None, record: bool = True
+    ) -> Optional[ParamMapping]:
+        try:
+            mapping = self.param_cache[spelling]
+        except KeyError:
+            base, form = split_spelling(spelling)
+            mapping = self.params.get(base, {}).get(form)
+            self.param_cache[spelling] = mapping
+        if mapping is None and record:
+            self.add_unknown(self.unknown_params, spelling, location)
+        return mapping
+
+    def ret(
+        self, spelling: str, location: Optional[str] = None, record: bool = True
+    ) -> Optional[ReturnMapping]:
+        try:
+            mapping = self.return_cache[spelling]
+        except KeyError:
+            base, form = split_spelling(spelling)
+            mapping = self.returns.get(base, {}).get(form)
+            self.return_cache[spelling] = mapping
+        if mapping is None and record:
+            self.add_unknown(self.unknown_returns, spelling, location)
+        return mapping
+
+    def add_unknown(
+        self, unknown: Counter, spelling: str, location: Optional[str]
+    ) -> None:
+        with self.lock:
+            unknown[spelling] += 1
+            if location is not None:
+                self.unknown_locations.setdefault(spelling, location)
+
+    def clear_unknown(self) -> None:
+        with self.lock:
+            self.unknown_params.clear()
+            self.unknown_returns.clear()
+            self.unknown_locations.clear()
+
+    def print_summary(self, file=sys.stderr) -> None:
+        # One line per unknown type, most frequent first
+        for kind, unknown in [
+            ("parameter", self.unknown_params),
+            ("return", self.unknown_returns),
+        ]:
+            for spelling, count in unknown.most_common():
+                location = self.unknown_locations.get(spelling)
+                example = f", e.g. at {location}" if location is not None else ""
+                print(
+                    f"WARN Unknown {kind} type {spelling} used {count} times{example}",
+                    file=file,
+                )
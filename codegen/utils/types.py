@@ -1,24 +1,16 @@
 from __future__ import annotations
 
-import os
-import re
 import sys
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Any, Dict, Generator, Iterator, List, Optional, Sequence, Set
-
-import yaml
-from clang.cindex import (
-    AccessSpecifier,
-    Config,
-    Cursor,
-    CursorKind,
-    FileInclusion,
-    Index,
-    TranslationUnit,
-)
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from clang.cindex import Cursor, CursorKind, TranslationUnit
 from clang.cindex import Type as CppType
-from clang.cindex import TypeKind, conf
+from clang.cindex import TypeKind
+from utils.clang import ErrorLocation, error_locations
+from utils.interface import MethodParam, ParamType
+from utils.type_map import TYPE_MAP_FILE, TypeRegistry
 
 
 def to_lean_type_name(type_name_cpp, cpp_type: CppType = None):
@@ -35,31 +27,121 @@ def check_valid(_cursor: Cursor):
     #     print(f'\tINVALID!!! {cursor.spelling}')
 
 
+@dataclass
+class ArgTypeWarning:
+    type_spelling: str
+    token_spellings: str
+    file: str
+    line: int
+    column: int
+
+    def __str__(self) -> str:
+        return f"Invalid argument type detected: {self.type_spelling} != {self.token_spellings} at {self.file}:{self.line}:{self.column}"
+
+
+# Gathers warnings of `check_arg_valid` to be printed at the end with hints, instead of one by one
+class ArgCheckReport:
+    warnings: List[ArgTypeWarning]
+    # Number of arguments checked, and how many of them had to be tokenized
+    checked: int = 0
+    tokenized: int = 0
+
+    def __init__(
+        self,
+        get_error_locations: Callable[
+            [TranslationUnit], Set[ErrorLocation]
+        ] = error_locations,
+    ):
+        self.warnings = []
+        self.get_error_locations = get_error_locations
+        self.error_locations_by_unit: Dict[str, Set[ErrorLocation]] = {}
+
+    def locations_of(self, ast: TranslationUnit) -> Set[ErrorLocation]:
+        # Error locations of a translation unit, computed once per unit
+        if ast.spelling not in self.error_locations_by_unit:
+            self.error_locations_by_unit[ast.spelling] = self.get_error_locations(ast)
+        return self.error_locations_by_unit[ast.spelling]
+
+    def add(self, warning: ArgTypeWarning):
+        self.warnings.append(warning)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "checked": self.checked,
+            "tokenized": self.tokenized,
+            "warnings": [asdict(warning) for warning in self.warnings],
+        }
+
+    def print(self, file=sys.stderr):
+        for warning in self.warnings:
+            print(f"WARN {warning}", file=file)
+        if self.warnings:
+            files = sorted({warning.file for warning in self.warnings})
+            print(
+                f"WARN {len(self.warnings)} invalid argument types in {len(files)} files, "
+                "check that C++ include paths (e.g. for std::string) are passed to the index",
+                file=file,
+            )
+
+
+def is_suspicious_arg(cursor: Cursor, error_lines: Set[ErrorLocation]) -> bool:
+    arg_type = cursor.type
+    if arg_type.kind == TypeKind.INVALID:
+        return True
+    # libclang only falls back to int when there's an error, which is reported as a diagnostic
+    location = cursor.location
+    if location.file is None or (location.file.name, location.line) not in error_lines:
+        return False
+    return "int" in arg_type.spelling or arg_type.kind == TypeKind.UNEXPOSED
+
+
 # If libclang can't determine a type, it's int! Should be fixed by adding C++ include paths to the index.
-# Here we have a hacky way to detect this error.
-# TODO: find a better way to detect argument type parsing error
-def check_arg_valid(cursor: Cursor, file=sys.stderr):
+# Here we detect this error from the diagnostics of the translation unit, and only tokenize
+# the arguments on the lines of errors to confirm it.
+def check_arg_valid(
+    cursor: Cursor, file=sys.stderr, report: Optional[ArgCheckReport] = None
+):
     check_valid(cursor)
+    if report is None:
+        report = ArgCheckReport()
+        print_now = True
+    else:
+        print_now = False
+
+    report.checked += 1
+    if not is_suspicious_arg(cursor, report.locations_of(cursor.translation_unit)):
+        return
+
+    report.tokenized += 1
     token_spellings = " ".join([token.spelling for token in cursor.get_tokens()])
     # If the argument type is int, but the token spellings don't contain 'int', it's probably a parsing error
     # Can confirm this works by removing C++ include paths from the index, then parse symbol.h which refers to std::string,
     # it will print out a lot of warnings like:
     # WARN Invalid argument type detected: const int & != const std :: string & initname at ginac-lean/build/ginac-1.8.7/ginac/symbol.h:43:38
-    if "int" in cursor.type.spelling and "int" not in token_spellings:
-        if "unsigned int" in cursor.type.spelling:
-            # Exclude false positives like:
-            # WARN Invalid argument type detected: unsigned int != unsigned inf at ginac-lean/build/ginac-1.8.7/ginac/symbol.h:48:21
-            return
-        # TODO: gather all the warnings and print them at the end, then give hints on how to fix them
-        print(
-            f"WARN Invalid argument type detected: {cursor.type.spelling} != {token_spellings} at {cursor.location.file.name}:{cursor.location.line}:{cursor.location.column}",
-            file=file,
-        )
+    if cursor.type.kind != TypeKind.INVALID and (
+        "int" not in cursor.type.spelling or "int" in token_spellings
+    ):
+        return
+    if "unsigned int" in cursor.type.spelling:
+        # Exclude false positives like:
+        # WARN Invalid argument type detected: unsigned int != unsigned inf at ginac-lean/build/ginac-1.8.7/ginac/symbol.h:48:21
+        return
+
+    warning = ArgTypeWarning(
+        type_spelling=cursor.type.spelling,
+        token_spellings=token_spellings,
+        file=cursor.location.file.name,
+        line=cursor.location.line,
+        column=cursor.location.column,
+    )
+    report.add(warning)
+    if print_now:
+        print(f"WARN {warning}", file=file)
 
 
 # TODO: add more primitive types
-def is_primitive_type(typekind: TypeKind):
-    return typekind in [
+PRIMITIVE_TYPE_KINDS = frozenset(
+    [
         TypeKind.BOOL,
         # TypeKind.CHAR_U,
         # TypeKind.UCHAR,
@@ -82,6 +164,11 @@ def is_primitive_type(typekind: TypeKind):
         TypeKind.DOUBLE,
         TypeKind.LONGDOUBLE,
     ]
+)
+
+
+def is_primitive_type(typekind: TypeKind):
+    return typekind in PRIMITIVE_TYPE_KINDS
 
 
 # FIXME maybe all these primitive types are not meant to mapped to Lean built-in types
@@ -110,6 +197,26 @@ MAP_PRIMITIVE_TYPE_TO_LEAN_TYPE: Dict[TypeKind, str] = {
 }
 
 
+# For types only known by their spelling, e.g. `qualType` in a JSON dump of the AST
+MAP_PRIMITIVE_SPELLING_TO_TYPE_KIND: Dict[str, TypeKind] = {
+    "bool": TypeKind.BOOL,
+    "unsigned short": TypeKind.USHORT,
+    "unsigned int": TypeKind.UINT,
+    "unsigned": TypeKind.UINT,
+    "unsigned long": TypeKind.ULONG,
+    "unsigned long long": TypeKind.ULONGLONG,
+    "unsigned __int128": TypeKind.UINT128,
+    "short": TypeKind.SHORT,
+    "int": TypeKind.INT,
+    "long": TypeKind.LONG,
+    "long long": TypeKind.LONGLONG,
+    "__int128": TypeKind.INT128,
+    "float": TypeKind.FLOAT,
+    "double": TypeKind.DOUBLE,
+    "long double": TypeKind.LONGDOUBLE,
+}
+
+
 def map_primitive_type(type_name: str, cpp_type: CppType):
     if cpp_type.kind in MAP_PRIMITIVE_TYPE_TO_LEAN_TYPE:
         return MAP_PRIMITIVE_TYPE_TO_LEAN_TYPE[cpp_type.kind]
@@ -125,28 +232,40 @@ def to_lean_method_name(method_name_cpp: str, cursor: Cursor) -> str:
         return method_name_cpp
 
 
-def from_lean_function(param_type_cpp: str, cursor: Cursor) -> str:
-    if param_type_cpp in ["const std::string &", "const char *"]:
-        return "lean_string_cstr(%s)"
-    else:
-        print(
-            f"WARN Unknown from_lean_function for {param_type_cpp} at {cursor.location.file.name}:{cursor.location.line}:{cursor.location.column}",
-            file=sys.stderr,
-        )
-        return "UNKOWN_FROM_LEAN_FUNCTION"
+def cursor_location(cursor: Cursor) -> str:
+    return (
+        f"{cursor.location.file.name}:{cursor.location.line}:{cursor.location.column}"
+    )
+
+
+def from_lean_function(param_type_cpp: str, _cursor: Cursor) -> str:
+    # Unknown parameter types are already recorded by `to_lean_param_name`
+    mapping = get_type_registry().param(param_type_cpp, record=False)
+    if mapping is not None:
+        return mapping.from_lean
+    # Keeps the argument, so that templates can always format it in
+    return "UNKOWN_FROM_LEAN_FUNCTION(%s)"
 
 
 def to_lean_function(param_type_cpp: str, _cpp_type: CppType) -> str:
-    if param_type_cpp in ["const std::string &"]:
-        return "lean_mk_string(%s.c_str())"
-    elif param_type_cpp in ["const char *"]:
-        return "lean_mk_string(%s)"
-    else:
-        # print(f'WARN Unknown to_lean_function for {param_type_cpp} at {cursor.location.file.name}:{cursor.location.line}:{cursor.location.column}', file=sys.stderr)
-        print(
-            f"INFO Default to_lean_function to as is for {param_type_cpp}"
-        )  # at {cursor.location.file.name}:{cursor.location.line}:{cursor.location.column}')
-        return "%s"
+    mapping = get_type_registry().ret(param_type_cpp)
+    if mapping is not None:
+        return mapping.to_lean
+    # Default to as is
+    return "%s"
+
+
+def to_lean_return_type_name(type_name_cpp: str, cpp_type: CppType) -> str:
+    # Unknown return types are already recorded by `to_lean_function`
+    mapping = get_type_registry().ret(type_name_cpp, record=False)
+    if mapping is not None:
+        return mapping.lean
+    return to_lean_type_name(type_name_cpp, cpp_type)
+
+
+def maps_return_type(type_name_cpp: str) -> bool:
+    # Unknown return types are already recorded by `to_lean_function`
+    return get_type_registry().ret(type_name_cpp, record=False) is not None
 
 
 def cursor_kind_spelling(kind: CursorKind) -> str:
@@ -160,13 +279,44 @@ def cursor_kind_spelling(kind: CursorKind) -> str:
 
 
 def to_lean_param_name(arg: Cursor) -> str:
-    if arg.type.is_pod() and is_primitive_type(arg.type.kind):
-        return map_primitive_type(arg.type.spelling, arg.type)
-    elif arg.type.spelling == "const std::string &":
-        return "@&String"
-    else:
-        print(
-            f"WARN Unknown to_lean_param_name for {arg.type.spelling} at {arg.location.file.name}:{arg.location.line}:{arg.location.column}",
-            file=sys.stderr,
+    mapping = get_type_registry().param(arg.type.spelling, cursor_location(arg))
+    if mapping is not None:
+        return mapping.lean
+    return "UNKOWN_LEAN_PARAM_NAME"
+
+
+def to_method_param(arg: Cursor) -> MethodParam:
+    # `arg` is a libclang cursor, or a stand-in for one read from a JSON dump of the AST
+    return MethodParam(
+        name=arg.spelling,
+        type=ParamType.interned(
+            cpp=arg.type.spelling,
+            lean=to_lean_param_name(arg),
+            from_lean=from_lean_function(arg.type.spelling, arg),
+        ),
+    )
+
+
+_type_registry: Optional[TypeRegistry] = None  # pylint: disable=invalid-name
+
+
+def get_type_registry(path: Path = TYPE_MAP_FILE) -> TypeRegistry:
+    # Loaded once from type_map.yml, unknown types are gathered across all collectors
+    global _type_registry  # pylint: disable=global-statement
+    if _type_registry is None:
+        _type_registry = TypeRegistry.load(
+            path,
+            {
+                spelling: MAP_PRIMITIVE_TYPE_TO_LEAN_TYPE[kind]
+                for spelling, kind in MAP_PRIMITIVE_SPELLING_TO_TYPE_KIND.items()
+            },
+            to_lean_type_name,
         )
-        return "UNKOWN_LEAN_PARAM_NAME"
+    return _type_registry
+
+
+def reload_type_registry(path: Path = TYPE_MAP_FILE) -> TypeRegistry:
+    # e.g. after type_map.yml was edited, the next collection picks up the new mappings
+    global _type_registry  # pylint: disable=global-statement
+    _type_registry = None
+    return get_type_registry(path)
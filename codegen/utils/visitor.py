@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import FrozenSet, Iterator, List, Optional
+
+from clang.cindex import AccessSpecifier, Cursor, CursorKind
+
+# Cursors whose children are declarations, the only ones a pruned walk descends into.
+# Everything else, e.g. function bodies and parameters, is never iterated from Python.
+SCOPE_CURSOR_KINDS: FrozenSet[CursorKind] = frozenset(
+    {
+        CursorKind.NAMESPACE,
+        CursorKind.LINKAGE_SPEC,
+        CursorKind.CLASS_DECL,
+        CursorKind.STRUCT_DECL,
+        CursorKind.CLASS_TEMPLATE,
+        CursorKind.CLASS_TEMPLATE_PARTIAL_SPECIALIZATION,
+    }
+)
+
+CLASS_CURSOR_KINDS: FrozenSet[CursorKind] = SCOPE_CURSOR_KINDS - {
+    CursorKind.NAMESPACE,
+    CursorKind.LINKAGE_SPEC,
+}
+
+METHOD_CURSOR_KINDS: FrozenSet[CursorKind] = frozenset(
+    {CursorKind.CONSTRUCTOR, CursorKind.CXX_METHOD}
+)
+
+
+# What a pruned walk yields, and which subtrees it doesn't descend into at all
+@dataclass(frozen=True)
+class CursorFilter:
+    # Kinds of the cursors yielded
+    kinds: FrozenSet[CursorKind]
+    # Members with another access are skipped with their subtrees, None for any access.
+    # Declarations that are not members, e.g. in a namespace, have no access and are kept.
+    access: Optional[FrozenSet[AccessSpecifier]] = frozenset({AccessSpecifier.PUBLIC})
+    # Top-level namespaces walked into, nested namespaces are walked with them.
+    # None for any, including the global namespace.
+    namespaces: Optional[FrozenSet[str]] = None
+    # Classes walked into, by spelling, None for any. Nested classes are walked only within them.
+    classes: Optional[FrozenSet[str]] = None
+
+    def in_namespaces(self, cursor: Cursor) -> bool:
+        # Whether a top-level cursor of a translation unit is walked
+        return self.namespaces is None or (
+            cursor.kind == CursorKind.NAMESPACE and cursor.spelling in self.namespaces
+        )
+
+
+def walk_pruned(cursor: Cursor, cursor_filter: CursorFilter) -> Iterator[Cursor]:
+    # Preorder walk from a top-level cursor of a translation unit, like `walk_preorder`
+    # but yielding only cursors of `cursor_filter.kinds`
+    if not cursor_filter.in_namespaces(cursor):
+        return
+
+    kinds = cursor_filter.kinds
+    access = cursor_filter.access
+    classes = cursor_filter.classes
+    stack: List[Cursor] = [cursor]
+    while stack:
+        cursor = stack.pop()
+        if access is not None:
+            cursor_access = cursor.access_specifier
+            if cursor_access != AccessSpecifier.INVALID and cursor_access not in access:
+                continue
+        kind = cursor.kind
+        if kind in kinds:
+            yield cursor
+        if kind not in SCOPE_CURSOR_KINDS:
+            continue
+        if (
+            classes is not None
+            and kind in CLASS_CURSOR_KINDS
+            and cursor.spelling not in classes
+        ):
+            continue
+        children = list(cursor.get_children())
+        children.reverse()
+        stack.extend(children)
@@ -0,0 +1,26 @@
+
+#include <lean/lean.h>
+#include <ginac/ginac.h>
+#include "CppClass.h"
+
+// Qualified, e.g. `function` is ambiguous with `std::function` otherwise.
+// Called once by `initialize` in Ginac/Classes.lean, before any object is allocated
+extern "C" LEAN_EXPORT lean_obj_res Ginac_registerClasses(lean_obj_arg /* world */) {
+    CppClass_register<GiNaC::add>();
+    CppClass_register<GiNaC::basic>();
+    CppClass_register<GiNaC::constant>();
+    CppClass_register<GiNaC::ex>();
+    CppClass_register<GiNaC::function>();
+    CppClass_register<GiNaC::idx>();
+    CppClass_register<GiNaC::indexed>();
+    CppClass_register<GiNaC::lst>();
+    CppClass_register<GiNaC::matrix>();
+    CppClass_register<GiNaC::mul>();
+    CppClass_register<GiNaC::numeric>();
+    CppClass_register<GiNaC::possymbol>();
+    CppClass_register<GiNaC::power>();
+    CppClass_register<GiNaC::realsymbol>();
+    CppClass_register<GiNaC::relational>();
+    CppClass_register<GiNaC::symbol>();
+    return lean_io_result_mk_ok(lean_box(0));
+}
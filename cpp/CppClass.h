@@ -3,27 +3,106 @@
 */
 #pragma once
 
+#include <new>
+#include <type_traits>
+#include <utility>
 #include <lean/lean.h>
 
+/** Objects up to this size are stored inline, in the payload of their Lean external object, define it as 0 to store
+    every object in its own heap allocation. It has to be the same in every translation unit.
+ */
+#ifndef CPPCLASS_INLINE_MAX_SIZE
+#define CPPCLASS_INLINE_MAX_SIZE 256
+#endif
+
+/** Whether `T` is stored inline: one allocation and one reference count per object instead of two, e.g. for GiNaC's
+    `ex`, which is already a reference-counted handle. The Lean object then comes from Lean's small object allocator,
+    which recycles freed objects of the same size per thread.
+ */
 template<class T>
-static void CppClass_finalize(void * obj){
+struct CppClassInline
+    : std::integral_constant<bool, sizeof(T) <= CPPCLASS_INLINE_MAX_SIZE
+                                   && alignof(T) <= alignof(lean_external_object)> {};
+
+template<class T>
+void CppClass_finalize(void * obj){
   delete static_cast<T*>(obj);
 }
 
 template<class T>
-static void CppClass_foreach(void *, b_lean_obj_arg){
+void CppClass_finalize_inline(void * obj){
+  // the memory belongs to the Lean object, freed by Lean right after
+  static_cast<T*>(obj)->~T();
+}
+
+template<class T>
+void CppClass_foreach(void *, b_lean_obj_arg){
   // do nothing since `S` does not contain nested Lean objects
 }
 
+/** The external class of `T`. A static data member of a class template has a single definition in the whole library,
+    unlike a `static` variable template, which has one per translation unit.
+    It is set once by `CppClass_register`, from the module initializer generated for all classes (see `Classes.cpp`),
+    before Lean code runs. Allocating then only reads it: no branch, and no race between tasks.
+ */
+template<class T>
+struct CppClassRegistry {
+  static lean_external_class * cls;
+};
+
+template<class T>
+lean_external_class * CppClassRegistry<T>::cls = nullptr;
+
+template<class T>
+void CppClass_register() {
+  if (CppClassRegistry<T>::cls == nullptr) {
+    CppClassRegistry<T>::cls = lean_register_external_class(
+      CppClassInline<T>::value ? CppClass_finalize_inline<T> : CppClass_finalize<T>, CppClass_foreach<T>);
+  }
+}
+
+template<class T, class... Args>
+static inline lean_object * make_cppClass_impl(std::true_type, Args &&... args) {
+  unsigned size = sizeof(lean_external_object) + sizeof(T);
+  auto o = reinterpret_cast<lean_external_object *>(lean_alloc_small_object(size));
+  try {
+    o->m_data = new (o + 1) T(std::forward<Args>(args)...);
+  } catch (...) {
+    lean_free_small_object(reinterpret_cast<lean_object *>(o));
+    throw;
+  }
+  lean_set_st_header(reinterpret_cast<lean_object *>(o), LeanExternal, 0);
+  o->m_class = CppClassRegistry<T>::cls;
+  return reinterpret_cast<lean_object *>(o);
+}
+
+template<class T, class... Args>
+static inline lean_object * make_cppClass_impl(std::false_type, Args &&... args) {
+  return lean_alloc_external(CppClassRegistry<T>::cls, new T(std::forward<Args>(args)...));
+}
+
+/** Constructs a `T` from `args` in a new Lean external object, inline or on the heap, see `CppClassInline`. */
+template<class T, class... Args>
+static inline lean_object * make_cppClass(Args &&... args) {
+  return make_cppClass_impl<T>(CppClassInline<T>(), std::forward<Args>(args)...);
+}
+
+/** Takes ownership of `t`. Objects stored inline are moved out of it, prefer `make_cppClass` then. */
 template<class T>
-static lean_external_class *CppClass_class = nullptr;
+static inline lean_object * of_cppClass_impl(std::true_type, T * t) {
+  lean_object * o = make_cppClass<T>(std::move(*t));
+  delete t;
+  return o;
+}
+
+template<class T>
+static inline lean_object * of_cppClass_impl(std::false_type, T * t) {
+  return lean_alloc_external(CppClassRegistry<T>::cls, t);
+}
 
 template<class T>
 static inline lean_object * of_cppClass(T * t) {
-    if (CppClass_class<T> == nullptr) {
-        CppClass_class<T> = lean_register_external_class(CppClass_finalize<T>, CppClass_foreach<T>);
-    }
-    return lean_alloc_external(CppClass_class<T>, t);
+  return of_cppClass_impl(CppClassInline<T>(), t);
 }
 
 template<class T>
@@ -32,14 +111,15 @@ static inline T * to_cppClass(b_lean_obj_arg o) {
 }
 
 /** Ensures that external object is exclusive and thus can be mutated. The type `T` has to have copy constructor.
+    Consumes `o`, so when it is shared, our reference to it is released after copying.
  */
 template<class T>
-lean_object * cppClass_make_exclusive(lean_object * o) {
+lean_object * cppClass_make_exclusive(lean_obj_arg o) {
   if (lean_is_exclusive(o)){
     return o;
   } else {
-    auto const& t = *to_cppClass<T>(o);
-    auto t_unique = new T{t};
-    return of_cppClass(t_unique);
+    auto t_unique = make_cppClass<T>(*to_cppClass<T>(o));
+    lean_dec_ref(o);
+    return t_unique;
   }
 }
@@ -0,0 +1,113 @@
+/*
+    Conversions between Lean `String` and C++ strings that use the sizes both sides already know,
+    instead of `strlen` on every crossing.
+*/
+#pragma once
+
+#include <algorithm>
+#include <climits>
+#include <cstring>
+#include <ostream>
+#include <streambuf>
+#include <string>
+#include <lean/lean.h>
+
+/** The size of a Lean string is in bytes and includes the terminating 0, so no `strlen` is needed. */
+static inline std::string to_std_string(b_lean_obj_arg s) {
+  return std::string(lean_string_cstr(s), lean_string_size(s) - 1);
+}
+
+static inline lean_obj_res of_std_string(std::string const & s) {
+  return lean_mk_string_from_bytes(s.data(), s.size());
+}
+
+/** A `std::streambuf` writing straight into the buffer of a Lean string, which grows like a `std::string` would.
+    `take` hands the string over to Lean, without copying it.
+ */
+class LeanStringBuf : public std::streambuf {
+public:
+  explicit LeanStringBuf(size_t capacity = 64) : m_string(nullptr) {
+    reserve(capacity);
+  }
+
+  ~LeanStringBuf() override {
+    if (m_string != nullptr) {
+      lean_dec_ref(m_string);
+    }
+  }
+
+  LeanStringBuf(LeanStringBuf const &) = delete;
+  LeanStringBuf & operator=(LeanStringBuf const &) = delete;
+
+  lean_obj_res take() {
+    size_t size = pptr() - pbase();
+    pbase()[size] = 0;
+    lean_string_object * s = lean_to_string(m_string);
+    s->m_size = size + 1;
+    s->m_length = lean_utf8_n_strlen(pbase(), size);
+    lean_object * result = m_string;
+    m_string = nullptr;
+    setp(nullptr, nullptr);
+    return result;
+  }
+
+protected:
+  int_type overflow(int_type ch) override {
+    if (traits_type::eq_int_type(ch, traits_type::eof())) {
+      return traits_type::not_eof(ch);
+    }
+    reserve(2 * capacity());
+    *pptr() = traits_type::to_char_type(ch);
+    pbump(1);
+    return ch;
+  }
+
+  std::streamsize xsputn(char const * data, std::streamsize n) override {
+    size_t size = pptr() - pbase();
+    if (size + n > capacity()) {
+      reserve(std::max(2 * capacity(), size + n));
+    }
+    std::memcpy(pptr(), data, n);
+    advance(n);
+    return n;
+  }
+
+private:
+  lean_object * m_string;
+
+  // Room for the terminating 0 is kept out of the put area
+  size_t capacity() const {
+    return epptr() - pbase();
+  }
+
+  void advance(size_t n) {
+    // `pbump` takes an int
+    while (n > 0) {
+      int step = n > INT_MAX ? INT_MAX : static_cast<int>(n);
+      pbump(step);
+      n -= step;
+    }
+  }
+
+  void reserve(size_t capacity) {
+    size_t size = m_string != nullptr ? pptr() - pbase() : 0;
+    lean_object * string = lean_alloc_string(1, capacity + 1, 0);
+    char * data = const_cast<char *>(lean_string_cstr(string));
+    if (m_string != nullptr) {
+      std::memcpy(data, pbase(), size);
+      lean_dec_ref(m_string);
+    }
+    m_string = string;
+    setp(data, data + capacity);
+    advance(size);
+  }
+};
+
+/** Prints `t` with `operator<<` straight into a Lean string, e.g. large expressions. */
+template<class T>
+static inline lean_obj_res of_printed(T const & t) {
+  LeanStringBuf buf;
+  std::ostream os(&buf);
+  os << t;
+  return buf.take();
+}
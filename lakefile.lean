@@ -26,6 +26,9 @@ lean_exe «ginac_hello» where
 
 def clangxx : String := "clang++"
 
+/-- Library search paths of the linker driven by `clang++`, to copy the C++ runtime libraries.
+  Unlike `.lake/build/codegen/clang-paths.json`, which caches the C++ include paths for codegen,
+  this only runs when those libraries are copied, and it runs before codegen ever did. -/
 def getClangSearchPaths : IO (Array FilePath) := do
   let output ← IO.Process.output {
     cmd := "clang++", args := #["-lstdc++", "-v"]
@@ -154,6 +157,10 @@ def buildCpp (pkg : Package) (path : FilePath) (deps : List (BuildJob FilePath))
     match get_config? targetArch with
     | none => pure ()
     | some arch => flags := flags.push s!"--target={arch}"
+    -- e.g. `-KcppClassInlineMaxSize=0` to allocate every C++ object apart from its Lean object, see cpp/CppClass.h
+    match get_config? cppClassInlineMaxSize with
+    | none => pure ()
+    | some size => flags := flags.push s!"-DCPPCLASS_INLINE_MAX_SIZE={size}"
     let args := flags ++ #["-I", (← getLeanIncludeDir).toString, "-I", (pkg.buildDir / "include").toString]
     buildFileAfterDepList oFile (srcJob :: deps) (extraDepTrace := computeHash flags) fun deps =>
       compileO oFile deps[0]! args clangxx
@@ -175,6 +182,7 @@ target libginac_ffi pkg : FilePath := do
 
   let srcFiles := #[
     pkg.dir / "cpp" / "GinacFFI.cpp",
+    pkg.dir / "cpp" / "Classes.cpp",
     pkg.dir / "cpp" / "Symbol.cpp"
   ]
 
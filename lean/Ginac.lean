@@ -1,3 +1,4 @@
+import Ginac.Classes
 import Ginac.Symbol
 
 @[extern "my_add"]
@@ -0,0 +1,11 @@
+
+
+namespace Ginac
+
+/-- Registers the external classes of all wrapped C++ classes, see `cpp/CppClass.h` -/
+@[extern "Ginac_registerClasses"]
+opaque registerClasses : IO Unit
+
+initialize registerClasses
+
+end Ginac
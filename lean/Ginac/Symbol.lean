@@ -1,3 +1,5 @@
+import Ginac.Classes
+
 namespace Ginac
 
 opaque SymbolPointed : NonemptyType
@@ -51,6 +51,9 @@ fi
 
 make install
 
+# The precompiled header of codegen includes the installed headers
+rm -rf $WORKSPACES/codegen/pch
+
 if [ "$RUNNER_OS" == "Windows" ]; then
     cp $INSTALLED_DIR/bin/libcln-6.dll $INSTALLED_DIR/lib/cln.dll
 fi
@@ -31,6 +31,9 @@ make -j8
 
 make install
 
+# The precompiled header of codegen includes the installed headers
+rm -rf $WORKSPACES/codegen/pch
+
 if [ "$RUNNER_OS" == "Windows" ]; then
     cp $INSTALLED_DIR/bin/libginac-11.dll $INSTALLED_DIR/lib/ginac.dll
 fi
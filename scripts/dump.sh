@@ -19,12 +19,8 @@ if [ ! -f $output_file ]; then
     clang -w -x c++ -std=c++14 -Xclang -ast-dump=json -fsyntax-only -fno-diagnostics-color -I$INCLUDE_PATH $header_full > $output_file.json
 fi
 
-# brew install jaq
-
-# jaq '.inner|length' $output_file.json
-
 echo "Shortening AST: $output_file.json -> $output_file-short.json"
 
-# -c for compact output
-jaq -f $SCRIPTS_DIR/dump.jq $output_file.json > $output_file-short.json
-
+# Streams the dump with ijson instead of loading it as a whole, see codegen/utils/ast_json.py.
+# The entities are the same as with `jaq -f $SCRIPTS_DIR/dump.jq`, only the order of keys differs.
+PYTHONPATH=$SCRIPTS_DIR/../codegen python -m utils.ast_json $output_file.json $output_file-short.json